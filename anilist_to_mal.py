@@ -0,0 +1,3216 @@
+import time
+# Startup timing (see StartupTimer) counts from here
+PROCESS_START = time.perf_counter()
+import json
+import re
+import random
+import codecs
+import io
+import csv
+import gzip
+import hashlib
+import sys
+import secrets
+import urllib.parse
+import os
+import platform
+import shutil
+import threading
+import tempfile
+import zlib
+from collections import deque
+from typing import (Dict, Optional, Any, List, Iterable, Iterator, Callable, Container, Tuple,
+                    TYPE_CHECKING)
+
+import argparse
+
+# requests, sqlite3, the profilers and the thread pool take as long to
+# import as everything else together, so they are imported where they are
+# first used and the window (or --help) comes up without them
+if TYPE_CHECKING:
+    import requests
+
+
+
+# Configuration
+class Config:
+    DEFAULT_OAUTH_URL = 'https://anilist.co/api/v2/oauth'
+    DEFAULT_GRAPHQL_URL = 'https://graphql.anilist.co'
+
+    def __init__(self, config_path: str = 'config.json'):
+        self.path = config_path
+        try:
+            with open(config_path) as f:
+                data = json.load(f)
+                self.username = data.get('username', '')
+                self.client_id = data.get('aniclient', '')
+                self.client_secret = data.get('anisecret', '')
+                self.redirect_url = data.get('redirectUrl', '')
+                self.browser = data.get('browser', '')
+                self.fetch_mode = data.get('fetchMode', 'collection')
+                self.page_concurrency = data.get('pageConcurrency', 4)
+                self.rate_limit = data.get('rateLimit', 90)
+                self.max_retries = data.get('maxRetries', 5)
+                self.connect_timeout = data.get('connectTimeout', 10)
+                self.read_timeout = data.get('readTimeout', 60)
+                self.oauth_url = data.get('oauthUrl', self.DEFAULT_OAUTH_URL)
+                self.graphql_url = data.get('graphqlUrl', self.DEFAULT_GRAPHQL_URL)
+                self.output_file = data.get('outputFile', './MAL.xml')
+                self.cache_ttl = data.get('cacheTtl', 3600)
+                self.cache_size = data.get('cacheSize', 256)
+                self.resume_exports = data.get('resumeExports', True)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.username = ''
+            self.client_id = ''
+            self.client_secret = ''
+            self.redirect_url = ''
+            self.browser = ''
+            self.fetch_mode = 'collection'
+            self.page_concurrency = 4
+            self.rate_limit = 90
+            self.max_retries = 5
+            self.connect_timeout = 10
+            self.read_timeout = 60
+            self.oauth_url = self.DEFAULT_OAUTH_URL
+            self.graphql_url = self.DEFAULT_GRAPHQL_URL
+            self.output_file = './MAL.xml'
+            self.cache_ttl = 3600
+            self.cache_size = 256
+            self.resume_exports = True
+    
+    def save(self, config_path: Optional[str] = None):
+        data = {
+            'username': self.username,
+            'aniclient': self.client_id,
+            'anisecret': self.client_secret,
+            'redirectUrl': self.redirect_url,
+            'browser': self.browser,
+            'fetchMode': self.fetch_mode,
+            'pageConcurrency': self.page_concurrency,
+            'rateLimit': self.rate_limit,
+            'maxRetries': self.max_retries,
+            'connectTimeout': self.connect_timeout,
+            'readTimeout': self.read_timeout,
+            'oauthUrl': self.oauth_url,
+            'graphqlUrl': self.graphql_url,
+            'outputFile': self.output_file,
+            'cacheTtl': self.cache_ttl,
+            'cacheSize': self.cache_size,
+            'resumeExports': self.resume_exports
+        }
+        with open(config_path or self.path, 'w') as f:
+            json.dump(data, f, indent=4)
+
+    def local_path(self, filename: str) -> str:
+        """Path of a file kept next to config.json, wherever it was started from."""
+        return os.path.join(os.path.dirname(os.path.abspath(self.path)), filename)
+
+
+class TokenStore:
+    """
+    Keeps Anilist access tokens between exports and app restarts, keyed by
+    client ID. The file is only readable by the current user.
+    """
+    # Treat tokens as expired a little early so an export never starts with
+    # a token that runs out halfway through
+    EXPIRY_MARGIN = 60 * 60
+
+    def __init__(self, token_path: str = 'token.json'):
+        self.token_path = token_path
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.token_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        tmp_path = self.token_path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.token_path)
+
+    def load(self, client_id: str) -> Optional[str]:
+        entry = self._read().get(client_id)
+        if not entry:
+            return None
+        if entry.get('expires_at', 0) - self.EXPIRY_MARGIN <= time.time():
+            return None
+        return entry.get('access_token')
+
+    def save(self, client_id: str, access_token: str, expires_in: int) -> None:
+        data = self._read()
+        data[client_id] = {
+            'access_token': access_token,
+            'expires_at': int(time.time()) + int(expires_in)
+        }
+        self._write(data)
+
+    def clear(self, client_id: str) -> None:
+        data = self._read()
+        if data.pop(client_id, None) is not None:
+            self._write(data)
+
+
+class IdMappingCache:
+    """
+    Persistent Anilist media ID -> MAL ID mapping. Known mappings are kept
+    for a month; media Anilist has no MAL ID for are checked again daily,
+    since mappings get added over time.
+    """
+    RESOLVED_TTL = 30 * 24 * 60 * 60
+    UNRESOLVED_TTL = 24 * 60 * 60
+
+    def __init__(self, db_path: str = 'id_mapping.db'):
+        self._lock = threading.Lock()
+        import sqlite3
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS mapping ('
+                'media_id INTEGER PRIMARY KEY, id_mal INTEGER, fetched_at INTEGER NOT NULL)')
+            self.evict_expired()
+
+    def evict_expired(self) -> None:
+        now = int(time.time())
+        with self._lock, self._db:
+            self._db.execute(
+                'DELETE FROM mapping WHERE fetched_at < ? - (CASE WHEN id_mal IS NULL THEN ? ELSE ? END)',
+                (now, self.UNRESOLVED_TTL, self.RESOLVED_TTL))
+
+    def get_many(self, media_ids: List[int]) -> Dict[int, Optional[int]]:
+        """Return the cached, unexpired mappings among `media_ids`."""
+        found = {}
+        now = int(time.time())
+        with self._lock:
+            # Stay under SQLite's limit on query parameters
+            for start in range(0, len(media_ids), 500):
+                batch = media_ids[start:start + 500]
+                rows = self._db.execute(
+                    f'SELECT media_id, id_mal, fetched_at FROM mapping '
+                    f'WHERE media_id IN ({",".join("?" * len(batch))})', batch)
+                for media_id, id_mal, fetched_at in rows:
+                    ttl = self.RESOLVED_TTL if id_mal is not None else self.UNRESOLVED_TTL
+                    if fetched_at + ttl >= now:
+                        found[media_id] = id_mal
+        return found
+
+    def put_many(self, mappings: Dict[int, Optional[int]]) -> None:
+        now = int(time.time())
+        with self._lock, self._db:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO mapping (media_id, id_mal, fetched_at) VALUES (?, ?, ?)',
+                [(media_id, id_mal, now) for media_id, id_mal in mappings.items()])
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class ResponseCache:
+    """
+    Gzip-compressed copies of recent list downloads, so exporting the same
+    list again (to another file or format) doesn't download it again.
+    Responses are keyed by username, media type and query, so a query
+    asking for other fields never gets an old answer. They expire after
+    `ttl` seconds, and the least recently used go once the cache holds
+    more than `max_bytes`.
+    """
+    def __init__(self, db_path: str = 'response_cache.db', ttl: int = 3600, max_bytes: int = 256 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        import sqlite3
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS response ('
+                'key TEXT PRIMARY KEY, username TEXT, media_type TEXT, entries INTEGER, '
+                'size INTEGER NOT NULL, created_at INTEGER NOT NULL, used_at REAL NOT NULL, body BLOB NOT NULL)')
+        self.evict()
+
+    @staticmethod
+    def key(username: str, media_type: str, query: str) -> str:
+        # Usernames are case-insensitive on Anilist; whitespace in the query doesn't matter
+        text = '\0'.join([username.lower(), media_type, ' '.join(query.split())])
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def evict(self) -> None:
+        """Drop expired responses, then the least recently used over `max_bytes`."""
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM response WHERE created_at < ?', (int(time.time()) - self.ttl,))
+            total = 0
+            stale = []
+            for key, size in self._db.execute('SELECT key, size FROM response ORDER BY used_at DESC'):
+                total += size
+                if total > self.max_bytes:
+                    stale.append((key,))
+            self._db.executemany('DELETE FROM response WHERE key = ?', stale)
+
+    def get(self, key: str) -> Optional[tuple]:
+        """Return the (compressed body, entry count) cached under `key`, if still fresh."""
+        with self._lock, self._db:
+            row = self._db.execute('SELECT body, entries FROM response WHERE key = ? AND created_at >= ?',
+                                   (key, int(time.time()) - self.ttl)).fetchone()
+            if row is not None:
+                self._db.execute('UPDATE response SET used_at = ? WHERE key = ?', (time.time(), key))
+        return row
+
+    def put(self, key: str, username: str, media_type: str, body: bytes, entries: int) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock, self._db:
+            self._db.execute(
+                'INSERT OR REPLACE INTO response (key, username, media_type, entries, size, created_at, used_at, body) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, username, media_type, entries, len(body), int(time.time()), time.time(), body))
+        self.evict()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+# Domain entities
+class AnimeStatus:
+    PLANNING = "PLANNING"
+    DROPPED = "DROPPED"
+    CURRENT = "CURRENT"
+    PAUSED = "PAUSED"
+    COMPLETED = "COMPLETED"
+    REPEATING = "REPEATING"
+    # Every list status, in the order status-by-status exports fetch them
+    ALL = (CURRENT, REPEATING, COMPLETED, PAUSED, DROPPED, PLANNING)
+
+    @staticmethod
+    def to_mal_status(status: str, media_type: str) -> str:
+        if status == AnimeStatus.PLANNING:
+            return "Plan to Watch" if media_type == 'ANIME' else "Plan to Read"
+        elif status == AnimeStatus.DROPPED:
+            return "Dropped"
+        elif status in (AnimeStatus.CURRENT, AnimeStatus.REPEATING):
+            # MAL has no rewatching status; the entry is being watched again
+            return "Watching" if media_type == 'ANIME' else "Reading"
+        elif status == AnimeStatus.PAUSED:
+            return "On-Hold"
+        elif "completed" in status.lower():
+            return "Completed"
+        return status
+
+    @staticmethod
+    def from_mal_status(mal_status: str, rewatching: bool = False) -> Optional[str]:
+        """Anilist status for a MAL one, the inverse of to_mal_status; None if unknown."""
+        status = {
+            'watching': AnimeStatus.CURRENT,
+            'reading': AnimeStatus.CURRENT,
+            'completed': AnimeStatus.COMPLETED,
+            'on-hold': AnimeStatus.PAUSED,
+            'dropped': AnimeStatus.DROPPED,
+            'plan to watch': AnimeStatus.PLANNING,
+            'plan to read': AnimeStatus.PLANNING,
+        }.get(mal_status.strip().lower())
+        if rewatching and status in (AnimeStatus.CURRENT, AnimeStatus.COMPLETED):
+            return AnimeStatus.REPEATING
+        return status
+
+
+class AnimeEntry:
+    """
+    One list entry, anime or manga, as every exporter uses it. Built once
+    from the Anilist response with the dates already formatted; `episodes`
+    holds the chapter count for manga. Fields the query didn't ask for
+    are None.
+    """
+    __slots__ = ('media_id', 'id_mal', 'episodes', 'progress', 'score', 'status',
+                 'started_at', 'completed_at', 'repeat', 'updated_at')
+
+    def __init__(self, data: Dict[str, Any], media_type: str = 'ANIME'):
+        media = data['media']
+        self.media_id = media.get('id')
+        self.id_mal = media['idMal']
+        self.episodes = media.get('chapters' if media_type == 'MANGA' else 'episodes')
+        self.progress = data['progress']
+        self.score = data['score']
+        self.status = data['status']
+        self.started_at = MALExporter.format_date(data['startedAt'])
+        self.completed_at = MALExporter.format_date(data['completedAt'])
+        self.repeat = data['repeat']
+        self.updated_at = data.get('updatedAt')
+
+    def astuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    @classmethod
+    def from_tuple(cls, values: Iterable[Any]) -> 'AnimeEntry':
+        entry = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, values):
+            setattr(entry, name, value)
+        return entry
+
+    def __eq__(self, other):
+        if not isinstance(other, AnimeEntry):
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+
+class UserStats:
+    def __init__(self):
+        self.total_anime = 0
+        self.total_watching = 0
+        self.total_completed = 0
+        self.total_onhold = 0
+        self.total_dropped = 0
+        self.total_plantowatch = 0
+
+    def add(self, status: str) -> None:
+        if status == AnimeStatus.PLANNING:
+            self.total_plantowatch += 1
+        elif status == AnimeStatus.DROPPED:
+            self.total_dropped += 1
+        elif status in (AnimeStatus.CURRENT, AnimeStatus.REPEATING):
+            self.total_watching += 1
+        elif status == AnimeStatus.PAUSED:
+            self.total_onhold += 1
+        elif "completed" in status.lower():
+            self.total_completed += 1
+        self.total_anime += 1
+
+
+# Browser utilities
+def get_installed_browsers() -> List[str]:
+    """
+    Get all browsers installed in the system.
+    Returns a list of browser names.
+    """
+    browsers = []
+    system = platform.system()
+    
+    # Check for common browsers by looking at default paths
+    if system == "Windows":
+        # Check Program Files directories
+        program_dirs = [
+            os.environ.get("ProgramFiles", "C:\\Program Files"),
+            os.environ.get("ProgramFiles(x86)", "C:\\Program Files (x86)")
+        ]
+        
+        browser_paths = {
+            "Chrome": ["Google\\Chrome\\Application\\chrome.exe"],
+            "Firefox": ["Mozilla Firefox\\firefox.exe"],
+            "Edge": ["Microsoft\\Edge\\Application\\msedge.exe"],
+            "Opera": ["Opera\\launcher.exe"],
+            "Brave": ["BraveSoftware\\Brave-Browser\\Application\\brave.exe"],
+            "Vivaldi": ["Vivaldi\\Application\\vivaldi.exe"]
+        }
+        
+        for browser, paths in browser_paths.items():
+            for program_dir in program_dirs:
+                for path in paths:
+                    if os.path.exists(os.path.join(program_dir, path)):
+                        browsers.append(browser)
+                        break
+                else:
+                    continue
+                break
+                
+    elif system == "Darwin":  # macOS
+        # Common browser bundle identifiers
+        mac_browsers = {
+            "Safari": "/Applications/Safari.app",
+            "Chrome": "/Applications/Google Chrome.app",
+            "Firefox": "/Applications/Firefox.app",
+            "Edge": "/Applications/Microsoft Edge.app",
+            "Opera": "/Applications/Opera.app",
+            "Brave": "/Applications/Brave Browser.app"
+        }
+        
+        for browser, path in mac_browsers.items():
+            if os.path.exists(path):
+                browsers.append(browser)
+                
+    elif system == "Linux":
+        # Check if browsers are in PATH
+        linux_browsers = ["google-chrome", "firefox", "chromium-browser", "opera", "brave-browser"]
+        
+        for browser in linux_browsers:
+            # Look the command up in PATH directly instead of forking `which`
+            if shutil.which(browser):
+                # Convert command name to proper name
+                if browser == "google-chrome":
+                    browsers.append("Chrome")
+                elif browser == "chromium-browser":
+                    browsers.append("Chromium")
+                elif browser == "brave-browser":
+                    browsers.append("Brave")
+                else:
+                    browsers.append(browser.capitalize())
+    
+    # Also check registered browsers in webbrowser module
+    import webbrowser
+    for browser in webbrowser._browsers:
+        browser_name = browser.split('-')[0].capitalize()
+        if browser_name not in browsers:
+            browsers.append(browser_name)
+    
+    return browsers
+
+
+class BrowserCache:
+    """
+    Remembers the installed browsers between app starts, so the window
+    doesn't have to wait for get_installed_browsers(). The list is
+    discovered again when the platform or PATH changes, or after MAX_AGE.
+    """
+    MAX_AGE = 7 * 24 * 60 * 60
+
+    def __init__(self, cache_path: str = 'browsers.json'):
+        self.cache_path = cache_path
+
+    @staticmethod
+    def fingerprint() -> str:
+        parts = [platform.system(), os.environ.get('PATH', ''),
+                 os.environ.get('ProgramFiles', ''), os.environ.get('ProgramFiles(x86)', '')]
+        return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def load(self) -> Optional[List[str]]:
+        """Return the cached browser list, or None if it is missing or stale."""
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if data.get('fingerprint') != self.fingerprint():
+            return None
+        if time.time() - data.get('created', 0) > self.MAX_AGE:
+            return None
+        return data.get('browsers')
+
+    def save(self, browsers: List[str]) -> None:
+        data = {'fingerprint': self.fingerprint(), 'created': int(time.time()), 'browsers': browsers}
+        tmp_path = self.cache_path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            # Only a cache: discovery just runs again next time
+            print(f"Could not save browser cache: {e}")
+
+    def discover(self) -> List[str]:
+        browsers = get_installed_browsers()
+        self.save(browsers)
+        return browsers
+
+
+class StartupTimer:
+    """
+    Records how long each startup phase took, counted from PROCESS_START,
+    and prints them once the app is interactive. Enabled with
+    --startup-timing or the ANILIST_STARTUP_TIMING environment variable;
+    every report is also appended to REPORT_FILE to track changes over time.
+    """
+    ENV_VAR = 'ANILIST_STARTUP_TIMING'
+    REPORT_FILE = 'startup_timing.jsonl'
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled or os.environ.get(self.ENV_VAR, '') not in ('', '0')
+        self.phases: List[tuple] = []
+        self._last = PROCESS_START
+
+    def mark(self, phase: str) -> None:
+        """Close `phase`, which ran from the previous mark until now."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last, now - PROCESS_START))
+        self._last = now
+
+    def report(self) -> None:
+        if not self.enabled or not self.phases:
+            return
+        for phase, seconds, total in self.phases:
+            print(f"startup {phase:<12} {seconds * 1000:>8.1f} ms {total * 1000:>8.1f} ms total")
+        record = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'phases': {phase: round(seconds, 4) for phase, seconds, _ in self.phases},
+            'total': round(self.phases[-1][2], 4)
+        }
+        with open(self.REPORT_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+        self.phases = []
+
+
+class Span:
+    """One timed phase; `args` (bytes, entries, ...) end up in the trace."""
+    __slots__ = ('tracer', 'name', 'args', 'profile', 'start', 'child_time', 'amount', 'profiler')
+
+    def __init__(self, tracer: 'Tracer', name: str, profile: bool = False, args: Optional[Dict[str, Any]] = None):
+        self.tracer = tracer
+        self.name = name
+        self.args = args or {}
+        self.profile = profile
+        self.start = 0.0
+        # Time spent in spans nested inside this one, on the same thread
+        self.child_time = 0.0
+        self.amount = 0
+        self.profiler = None
+
+    def set(self, **args) -> None:
+        self.args.update(args)
+
+    def add(self, key: str, amount: int) -> None:
+        self.args[key] = self.args.get(key, 0) + amount
+
+    def __enter__(self):
+        self.tracer.enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.exit(self)
+        return False
+
+
+class _NullSpan:
+    """What Tracer.span() returns while tracing is off: does nothing."""
+    def set(self, **args) -> None:
+        pass
+
+    def add(self, key: str, amount: int) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class Tracer:
+    """
+    Optional timing of export phases. Spans nest per thread, so each one
+    records its own time apart from the spans inside it. Iterators wrapped
+    with timed() are measured only while they produce items, which splits
+    a streaming pipeline into network, decoding and writing time.
+    
+    Enabled with --trace FILE or the ANILIST_TRACE environment variable;
+    the trace is written as JSON or, with the "chrome" format, for
+    chrome://tracing and Perfetto. With profiling on, spans opened with
+    profile=True run under cProfile and tracemalloc, and the profiles of
+    the PROFILED_SPANS slowest are kept. While off, span() returns a shared
+    no-op object and timed() returns its iterable unchanged.
+    """
+    ENV_VAR = 'ANILIST_TRACE'
+    FORMAT_ENV_VAR = 'ANILIST_TRACE_FORMAT'
+    PROFILE_ENV_VAR = 'ANILIST_TRACE_PROFILE'
+    FORMATS = ('json', 'chrome')
+    PROFILED_SPANS = 3
+    PROFILE_LINES = 25
+    # Later spans only count towards the phase totals
+    MAX_SPANS = 100000
+    _NULL_SPAN = _NullSpan()
+
+    def __init__(self):
+        self.enabled = False
+        self.filename = ''
+        self.trace_format = 'json'
+        self.profile = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.started = time.perf_counter()
+        self.spans: List[tuple] = []
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.profiles: List[Dict[str, Any]] = []
+        self.threads: Dict[int, str] = {}
+
+    @classmethod
+    def from_env(cls) -> 'Tracer':
+        tracer = cls()
+        if os.environ.get(cls.ENV_VAR):
+            tracer.configure(os.environ[cls.ENV_VAR], os.environ.get(cls.FORMAT_ENV_VAR, 'json'),
+                             os.environ.get(cls.PROFILE_ENV_VAR, '') not in ('', '0'))
+        return tracer
+
+    def configure(self, filename: str, trace_format: str = 'json', profile: bool = False) -> None:
+        if trace_format not in self.FORMATS:
+            raise ValueError(f"Unknown trace format {trace_format!r}, expected one of {', '.join(self.FORMATS)}")
+        self.enabled = True
+        self.filename = filename
+        self.trace_format = trace_format
+        self.profile = profile
+        if profile:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        self._reset()
+
+    def span(self, name: str, profile: bool = False, **args):
+        if not self.enabled:
+            return self._NULL_SPAN
+        return Span(self, name, profile and self.profile, args)
+
+    def timed(self, name: str, iterable: Iterable[Any], unit: str = 'items',
+              measure: Optional[Callable[[Any], int]] = None) -> Iterable[Any]:
+        """Measure the time spent producing items from `iterable` and count them in `unit`."""
+        if not self.enabled:
+            return iterable
+        return self._timed(Span(self, name), iter(iterable), unit, measure)
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enter(self, span: Span) -> None:
+        self._stack().append(span)
+        if span.profile and not getattr(self._local, 'profiling', False):
+            import cProfile
+            span.profiler = cProfile.Profile()
+            try:
+                span.profiler.enable()
+                self._local.profiling = True
+            except ValueError:
+                # Another profiler is already running on this thread
+                span.profiler = None
+        span.start = time.perf_counter()
+
+    def exit(self, span: Span) -> None:
+        end = time.perf_counter()
+        elapsed = end - span.start
+        stack = self._stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_time += elapsed
+        if span.profiler is not None:
+            span.profiler.disable()
+            self._local.profiling = False
+            self._keep_profile(span, elapsed)
+        self._record(span.name, span.start, elapsed, elapsed - span.child_time, span.args)
+
+    def _timed(self, aggregate: Span, iterator: Iterator[Any], unit: str,
+               measure: Optional[Callable[[Any], int]]) -> Iterator[Any]:
+        first_start = None
+        total = own = 0.0
+        calls = 0
+        try:
+            while True:
+                stack = self._stack()
+                aggregate.child_time = 0.0
+                stack.append(aggregate)
+                start = time.perf_counter()
+                if first_start is None:
+                    first_start = start
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed = time.perf_counter() - start
+                    stack.pop()
+                    if stack:
+                        stack[-1].child_time += elapsed
+                    total += elapsed
+                    own += elapsed - aggregate.child_time
+                    calls += 1
+                aggregate.amount += measure(item) if measure else 1
+                yield item
+        finally:
+            if first_start is not None:
+                self._record(aggregate.name, first_start, total, own, {unit: aggregate.amount, 'calls': calls})
+
+    def _record(self, name: str, start: float, elapsed: float, own: float, args: Dict[str, Any]) -> None:
+        thread = threading.current_thread()
+        with self._lock:
+            self.threads[thread.ident] = thread.name
+            if len(self.spans) < self.MAX_SPANS:
+                self.spans.append((name, start - self.started, elapsed, own, thread.ident, dict(args)))
+            phase = self.phases.setdefault(name, {'count': 0, 'seconds': 0.0, 'self_seconds': 0.0})
+            phase['count'] += 1
+            phase['seconds'] += elapsed
+            phase['self_seconds'] += own
+            for key in ('bytes', 'entries'):
+                if isinstance(args.get(key), int):
+                    phase[key] = phase.get(key, 0) + args[key]
+
+    def _keep_profile(self, span: Span, elapsed: float) -> None:
+        with self._lock:
+            if len(self.profiles) >= self.PROFILED_SPANS and elapsed <= self.profiles[-1]['seconds']:
+                return
+        # Only formatted for spans that make the cut
+        import pstats
+        import tracemalloc
+        stream = io.StringIO()
+        pstats.Stats(span.profiler, stream=stream).sort_stats('cumulative').print_stats(self.PROFILE_LINES)
+        profile = {'name': span.name, 'seconds': round(elapsed, 6), 'args': dict(span.args),
+                   'cprofile': stream.getvalue()}
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:10]
+            profile['memory'] = {'current_kib': round(current / 1024, 1), 'peak_kib': round(peak / 1024, 1),
+                                 'top': [str(stat) for stat in statistics]}
+        with self._lock:
+            self.profiles.append(profile)
+            self.profiles.sort(key=lambda item: item['seconds'], reverse=True)
+            del self.profiles[self.PROFILED_SPANS:]
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.trace_format == 'chrome':
+                events = [{'name': name, 'ph': 'X', 'ts': round(start * 1e6), 'dur': round(elapsed * 1e6),
+                           'pid': os.getpid(), 'tid': tid, 'args': dict(args, self_ms=round(own * 1000, 3))}
+                          for name, start, elapsed, own, tid, args in self.spans]
+                events += [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                           for tid, name in self.threads.items()]
+                return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                        'metadata': {'phases': self.phases, 'profiles': self.profiles}}
+            return {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'seconds': round(time.perf_counter() - self.started, 6),
+                'phases': self.phases,
+                'spans': [{'name': name, 'start': round(start, 6), 'seconds': round(elapsed, 6),
+                           'self_seconds': round(own, 6), 'thread': self.threads.get(tid, tid), 'args': args}
+                          for name, start, elapsed, own, tid, args in self.spans],
+                'profiles': self.profiles
+            }
+
+    def save(self) -> None:
+        if not self.enabled or not self.phases:
+            return
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=1)
+        slowest = sorted(self.phases.items(), key=lambda item: item[1]['self_seconds'], reverse=True)[:5]
+        print(f"Trace written to {self.filename}; most time spent in: " +
+              ', '.join(f"{name} {phase['self_seconds']:.2f}s" for name, phase in slowest))
+
+
+# Export phases are traced through this; see Tracer
+TRACER = Tracer.from_env()
+
+
+# Use cases
+class IncompleteResponseError(ValueError):
+    """A list response that ended before the JSON document did."""
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportProgress:
+    """
+    Live counters for one export, updated by the fetch and write threads,
+    plus a cooperative cancel flag they check between network chunks and
+    batches of entries. `listener` is called at most every REPORT_INTERVAL
+    seconds with this object.
+    """
+    REPORT_INTERVAL = 0.2
+
+    def __init__(self, listener: Optional[Callable[['ExportProgress'], None]] = None):
+        self.listener = listener
+        self.total_entries: Optional[int] = None
+        self.bytes_received = 0
+        self.pages_fetched = 0
+        self.entries_written = 0
+        self.started = time.monotonic()
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._last_report = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def check_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise ExportCancelled("Export cancelled")
+
+    def wait(self, seconds: float) -> None:
+        """Sleep, waking up early if the export is cancelled."""
+        self._cancelled.wait(seconds)
+        self.check_cancelled()
+
+    def add_bytes(self, size: int) -> None:
+        with self._lock:
+            self.bytes_received += size
+        self.report()
+
+    def add_page(self) -> None:
+        with self._lock:
+            self.pages_fetched += 1
+        self.report()
+
+    def add_entries(self, count: int) -> None:
+        with self._lock:
+            self.entries_written += count
+        self.report()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def entries_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.entries_written / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def percent(self) -> Optional[int]:
+        if not self.total_entries:
+            return None
+        return min(99, int(self.entries_written * 100 / self.total_entries))
+
+    @property
+    def eta(self) -> Optional[float]:
+        rate = self.entries_per_second
+        if not self.total_entries or not rate:
+            return None
+        return max(0.0, (self.total_entries - self.entries_written) / rate)
+
+    def summary(self) -> str:
+        written = f"{self.entries_written:,}"
+        if self.total_entries:
+            written += f" / {self.total_entries:,}"
+        text = (f"{written} entries, {self.entries_per_second:,.0f} entries/s, "
+                f"{self.bytes_received / (1024 * 1024):.1f} MiB, {self.pages_fetched} page(s)")
+        if self.eta is not None:
+            text += f", ETA {self.eta:.0f}s"
+        return text
+
+    def report(self, force: bool = False) -> None:
+        if not self.listener:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_report < self.REPORT_INTERVAL:
+            return
+        self._last_report = now
+        self.listener(self)
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread talking to Anilist, sized to the
+    API's per-minute request quota.
+    """
+    def __init__(self, requests_per_minute: int = 90):
+        self.capacity = max(1, requests_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, requests_per_minute: int) -> None:
+        with self._lock:
+            self.capacity = max(1, requests_per_minute)
+            self.rate = self.capacity / 60.0
+            self.tokens = min(self.tokens, float(self.capacity))
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ThrottleStats:
+    """
+    Counts retries and the time requests spent held back by the rate limit
+    or a retry delay. The time is wall-clock: while several threads wait at
+    once it is counted once, so it never exceeds how long the requests took.
+    """
+    def __init__(self):
+        self.retries = 0
+        self.throttled_seconds = 0.0
+        self._waiting = 0
+        self._waiting_since = 0.0
+        self._lock = threading.Lock()
+
+    def start_wait(self) -> None:
+        with self._lock:
+            if not self._waiting:
+                self._waiting_since = time.monotonic()
+            self._waiting += 1
+
+    def end_wait(self) -> None:
+        with self._lock:
+            self._waiting -= 1
+            if not self._waiting:
+                self.throttled_seconds += time.monotonic() - self._waiting_since
+
+    def add_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def report(self) -> str:
+        return f"{self.retries} retries, {self.throttled_seconds:.1f}s throttled"
+
+
+class RequestScheduler:
+    """
+    Paces GraphQL requests so they stay under Anilist's rate limit and
+    retries idempotent ones that fail with 429, a 5xx or a dropped
+    connection, using jittered exponential backoff. The X-RateLimit-* and
+    Retry-After headers of every response hold back all threads sharing
+    the scheduler until the limit resets. One instance is shared by every
+    request of an export, or of a whole batch.
+    """
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    BASE_DELAY = 1.0
+    MAX_DELAY = 60.0
+
+    def __init__(self, requests_per_minute: int = 90, max_retries: int = 5):
+        self.limiter = RateLimiter(requests_per_minute)
+        self.max_retries = max_retries
+        self.requests = 0
+        # Totals over every request sent through this scheduler
+        self.stats = ThrottleStats()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def retry_errors() -> Tuple[type, ...]:
+        import requests
+        return requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError
+
+    @classmethod
+    def stream_errors(cls) -> Tuple[type, ...]:
+        """What a connection dropped while a streamed body is read looks like."""
+        import requests
+        return cls.retry_errors() + (requests.exceptions.ContentDecodingError, IncompleteResponseError)
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.MAX_DELAY, self.BASE_DELAY * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _throttled(self, wait: Callable[[], None], stats: Optional[ThrottleStats]) -> None:
+        counters = [self.stats] if stats is None else [self.stats, stats]
+        for counter in counters:
+            counter.start_wait()
+        try:
+            wait()
+        finally:
+            for counter in counters:
+                counter.end_wait()
+
+    def _sleep(self, seconds: float, progress: Optional[ExportProgress],
+               stats: Optional[ThrottleStats] = None) -> None:
+        if progress:
+            self._throttled(lambda: progress.wait(seconds), stats)
+        else:
+            self._throttled(lambda: time.sleep(seconds), stats)
+
+    def _wait_turn(self, progress: Optional[ExportProgress], stats: Optional[ThrottleStats] = None) -> None:
+        with self._lock:
+            blocked = self._blocked_until - time.monotonic()
+        if blocked > 0:
+            self._sleep(blocked, progress, stats)
+        self._throttled(self.limiter.acquire, stats)
+        with self._lock:
+            self.requests += 1
+
+    def _block_for(self, seconds: float) -> None:
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    @staticmethod
+    def _header_number(response: 'requests.Response', name: str) -> Optional[float]:
+        try:
+            return float(response.headers[name])
+        except (KeyError, ValueError):
+            return None
+
+    def _observe(self, response: 'requests.Response') -> Optional[float]:
+        """Update pacing from the rate limit headers; return how long to wait before a retry."""
+        retry_after = self._header_number(response, 'Retry-After')
+        reset = self._header_number(response, 'X-RateLimit-Reset')
+        until_reset = max(0.0, reset - time.time()) if reset is not None else None
+        if response.status_code == 429:
+            delay = retry_after if retry_after is not None else until_reset
+            if delay is not None:
+                self._block_for(delay)
+            return delay
+        limit = self._header_number(response, 'X-RateLimit-Limit')
+        if limit and limit < self.limiter.capacity:
+            # Anilist lowers the quota at times; pace to what it reports
+            self.limiter.set_rate(int(limit))
+        remaining = self._header_number(response, 'X-RateLimit-Remaining')
+        if remaining is not None and remaining <= 1 and until_reset:
+            # About to hit the limit: hold everyone back until it resets
+            self._block_for(until_reset)
+        return retry_after
+
+    def send(self, request: Callable[[], 'requests.Response'], idempotent: bool = True,
+             progress: Optional[ExportProgress] = None,
+             stats: Optional[ThrottleStats] = None) -> 'requests.Response':
+        """
+        Send `request` when the rate limit allows it. Retries and waits are
+        counted in the scheduler's totals and, if given, in `stats` as well.
+        """
+        attempt = 0
+        while True:
+            if progress:
+                progress.check_cancelled()
+            self._wait_turn(progress, stats)
+            try:
+                response = request()
+            except self.retry_errors() as e:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                print(f"Request failed ({e}), retrying in {delay:.1f}s")
+            else:
+                retry_delay = self._observe(response)
+                if response.status_code not in self.RETRY_STATUSES or not idempotent or attempt >= self.max_retries:
+                    return response
+                response.close()
+                delay = retry_delay if retry_delay is not None else self.backoff(attempt)
+                print(f"Anilist answered {response.status_code}, retrying in {delay:.1f}s")
+            attempt += 1
+            self.wait_to_retry(delay, progress, stats)
+
+    def wait_to_retry(self, delay: float, progress: Optional[ExportProgress] = None,
+                      stats: Optional[ThrottleStats] = None) -> None:
+        self.stats.add_retry()
+        if stats is not None:
+            stats.add_retry()
+        self._sleep(delay, progress, stats)
+
+    def report(self) -> str:
+        return self.stats.report()
+
+
+# Fields each output format reads from a MediaList entry, per media type.
+# The GraphQL selection is built from these so nothing else is downloaded.
+_ENTRY_FIELDS = (
+    'status', 'progress', 'repeat', 'score',
+    'startedAt.year', 'startedAt.month', 'startedAt.day',
+    'completedAt.year', 'completedAt.month', 'completedAt.day',
+    'media.id', 'media.idMal',
+)
+OUTPUT_FIELDS = {
+    'xml': {
+        'ANIME': _ENTRY_FIELDS + ('media.episodes',),
+        'MANGA': _ENTRY_FIELDS + ('media.chapters',),
+    },
+    # Archive formats keep the Anilist IDs and last update time as well
+    'jsonl': {
+        'ANIME': _ENTRY_FIELDS + ('media.episodes', 'updatedAt'),
+        'MANGA': _ENTRY_FIELDS + ('media.chapters', 'updatedAt'),
+    },
+    'csv': {
+        'ANIME': _ENTRY_FIELDS + ('media.episodes', 'updatedAt'),
+        'MANGA': _ENTRY_FIELDS + ('media.chapters', 'updatedAt'),
+    },
+    # Not an output format: what incremental exports need to track entries
+    'snapshot': {
+        'ANIME': ('media.id', 'updatedAt'),
+        'MANGA': ('media.id', 'updatedAt'),
+    },
+}
+
+FIELD_ARGUMENTS = {
+    'score': '(format: POINT_10)',
+}
+
+
+def build_selection(media_type: str, formats: Iterable[str] = ('xml',)) -> str:
+    """
+    Build the GraphQL selection set for MediaList entries from the fields
+    the requested output formats use.
+    """
+    tree: Dict[str, Any] = {}
+    for output_format in formats:
+        for path in OUTPUT_FIELDS[output_format][media_type]:
+            node = tree
+            for part in path.split('.'):
+                node = node.setdefault(part, {})
+
+    def render(node: Dict[str, Any]) -> str:
+        fields = []
+        for name in sorted(node):
+            field = name + FIELD_ARGUMENTS.get(name, '')
+            if node[name]:
+                field += ' { ' + render(node[name]) + ' }'
+            fields.append(field)
+        return ' '.join(fields)
+
+    return ' ' + render(tree) + ' '
+
+
+class HttpClient:
+    """
+    Keep-alive HTTP session for all Anilist requests. Connections are pooled
+    and reused across threads, and gzip/deflate responses are decoded
+    transparently.
+    """
+    HEADERS = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/86.0.4240.75 Safari/537.36',
+        'accept': 'application/json',
+        'Accept-Encoding': 'gzip, deflate'
+    }
+
+    def __init__(self, config: Config, pool_size: int = 10):
+        self.timeout = (config.connect_timeout, config.read_timeout)
+        self.pool_size = max(1, pool_size)
+        self._session: Optional['requests.Session'] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> 'requests.Session':
+        # Set up on the first request, so opening the window doesn't import requests
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                session.headers.update(self.HEADERS)
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+            return self._session
+
+    def post_json(self, url: str, payload: Dict[str, Any],
+                  headers: Optional[Dict[str, str]] = None, stream: bool = False) -> 'requests.Response':
+        return self.session.post(url, json=payload, headers=headers, timeout=self.timeout, stream=stream)
+
+    def close(self) -> None:
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class EntryStreamParser:
+    """
+    Pulls MediaList entries out of a MediaListCollection response while it
+    downloads. Each `"entries": [...]` array is located in the text and its
+    objects are decoded one by one, so only about one entry plus one network
+    chunk is held in memory at a time.
+    """
+    ENTRIES_KEY = re.compile(r'"entries"\s*:\s*\[')
+    # Enough of the response start to report GraphQL errors
+    PREAMBLE_SIZE = 64 * 1024
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._preamble = ''
+
+    def _fill(self) -> bool:
+        for chunk in self.chunks:
+            text = self._text_decoder.decode(chunk)
+            if text:
+                self._buffer = self._buffer[self._pos:] + text
+                self._pos = 0
+                if len(self._preamble) < self.PREAMBLE_SIZE:
+                    self._preamble += text[:self.PREAMBLE_SIZE - len(self._preamble)]
+                return True
+        return False
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        found_entries = False
+        in_array = False
+        while True:
+            if not in_array:
+                match = self.ENTRIES_KEY.search(self._buffer, self._pos)
+                if match:
+                    self._pos = match.end()
+                    in_array = found_entries = True
+                    continue
+                # Keep a short tail in case the key is split across chunks
+                self._pos = max(self._pos, len(self._buffer) - 32)
+                if not self._fill():
+                    break
+                continue
+            
+            buffer = self._buffer
+            pos = self._pos
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            self._pos = pos
+            if pos == len(buffer):
+                if not self._fill():
+                    raise IncompleteResponseError("Anilist response ended in the middle of the list")
+                continue
+            if buffer[pos] == ']':
+                self._pos = pos + 1
+                in_array = False
+                continue
+            try:
+                item, self._pos = self._json_decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Most likely an entry split across chunks
+                if not self._fill():
+                    raise IncompleteResponseError("Anilist response ended in the middle of an entry")
+                continue
+            yield item
+        
+        if not found_entries:
+            self._raise_for_errors()
+
+    def _raise_for_errors(self) -> None:
+        try:
+            document = json.loads(self._preamble)
+        except json.JSONDecodeError:
+            raise ValueError("Could not read the Anilist response")
+        if document.get('errors'):
+            raise ValueError(f"Anilist returned an error: {document['errors'][0].get('message')}")
+
+
+class AnilistService:
+    PAGE_SIZE = 50
+    ID_PAGES_PER_REQUEST = 4
+    # Aliased SaveMediaListEntry mutations sent in one request
+    MUTATIONS_PER_REQUEST = 50
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    # Anilist tokens are valid for a year; used when the response omits expires_in
+    DEFAULT_TOKEN_LIFETIME = 365 * 24 * 60 * 60
+    # How long to wait for the user to authorize in the browser
+    OAUTH_TIMEOUT = 300
+
+    def __init__(self, config: Config, parent=None, token_store: Optional[TokenStore] = None,
+                 scheduler: Optional[RequestScheduler] = None, http_client: Optional[HttpClient] = None,
+                 response_cache: Optional[ResponseCache] = None):
+        self.config = config
+        self.http = http_client if http_client is not None else HttpClient(config, config.page_concurrency)
+        self.scheduler = (scheduler if scheduler is not None
+                          else RequestScheduler(config.rate_limit, config.max_retries))
+        self.access_token = None
+        self.redirect_uri = ''
+        self.parent = parent
+        self.token_store = token_store if token_store is not None else TokenStore()
+        self._token_lock = threading.Lock()
+        self.formats = ('xml',)
+        self.progress: Optional[ExportProgress] = None
+        # Whole-list downloads are stored here, and only reused with `use_cache`
+        self.response_cache = response_cache
+        self.use_cache = False
+        # Response sizes, to keep an eye on how much each export downloads
+        self.requests_made = 0
+        self.bytes_received = 0
+        self.cache_hits = 0
+        self._stats_lock = threading.Lock()
+        # Retries and rate limit waits of this service's own requests
+        self.throttle_stats = ThrottleStats()
+
+    def request_code(self) -> str:
+        # Listen for the OAuth callback in the background
+        import webbrowser
+        from oauth_callback import OAuthCallbackServer
+        server = OAuthCallbackServer.acquire(self.config.redirect_url)
+        authorization = server.expect(secrets.token_urlsafe(16))
+        self.redirect_uri = server.redirect_uri
+        try:
+            # Open the authorization URL in the browser
+            query = urllib.parse.urlencode({
+                'client_id': self.config.client_id,
+                'redirect_uri': self.redirect_uri,
+                'response_type': 'code',
+                'state': authorization.state
+            })
+            url = f"{self.config.oauth_url}/authorize?{query}"
+            
+            # Use the configured browser if available
+            if self.config.browser:
+                try:
+                    browser_controller = webbrowser.get(self.config.browser.lower())
+                    browser_controller.open(url)
+                except Exception as e:
+                    print(f"Error opening configured browser: {e}")
+                    webbrowser.open(url)  # Fallback to default
+            else:
+                webbrowser.open(url)
+            
+            code = authorization.wait(self.OAUTH_TIMEOUT, self.progress)
+            if not code:
+                print("OAuth server timed out waiting for response")
+            return code
+        finally:
+            server.forget(authorization)
+            server.release()
+
+    def request_token(self) -> Optional[str]:
+        # Concurrent page fetches must not start several OAuth flows
+        with self._token_lock:
+            return self._request_token()
+
+    def _request_token(self) -> Optional[str]:
+        if self.access_token:
+            return self.access_token
+        self.access_token = self.token_store.load(self.config.client_id)
+        if self.access_token:
+            return self.access_token
+        with TRACER.span('oauth.request_code'):
+            code = self.request_code()
+        print(code)
+        body = {
+            'grant_type': 'authorization_code',
+            'client_id': self.config.client_id,
+            'client_secret': self.config.client_secret,
+            'redirect_uri': self.redirect_uri or self.config.redirect_url,
+            'code': code
+        }
+        try:
+            with TRACER.span('oauth.request_token', profile=True):
+                response = self.http.post_json(f"{self.config.oauth_url}/token", body)
+                response.raise_for_status()
+                response_data = response.json()
+            self.access_token = response_data.get("access_token")
+            if self.access_token:
+                expires_in = response_data.get("expires_in", self.DEFAULT_TOKEN_LIFETIME)
+                self.token_store.save(self.config.client_id, self.access_token, expires_in)
+            return self.access_token
+        except Exception as e:
+            print(f"Error requesting token: {e}")
+            return None
+        
+
+    def payload_report(self) -> str:
+        report = (f"{self.requests_made} request(s), {self.bytes_received / 1024:.1f} KiB received, "
+                  f"{self.throttle_stats.report()}")
+        if self.cache_hits:
+            report += f", {self.cache_hits} list(s) from the response cache"
+        return report
+
+    def invalidate_token(self) -> None:
+        self.access_token = None
+        self.token_store.clear(self.config.client_id)
+
+    def _send_graphql(self, query: str, variables: Dict[str, Any], stream: bool = False,
+                      idempotent: bool = True) -> 'requests.Response':
+        payload = {'query': query, 'variables': variables}
+        for attempt in range(2):
+            headers = {'Authorization': f"Bearer {self.request_token()}"}
+            with TRACER.span('graphql.request', profile=True, stream=stream) as span:
+                response = self.scheduler.send(
+                    lambda: self.http.post_json(self.config.graphql_url, payload, headers, stream=stream),
+                    idempotent, self.progress, self.throttle_stats)
+                span.set(status=response.status_code)
+            # A revoked or expired token: authorize again, once
+            if response.status_code == 401 and not attempt:
+                response.close()
+                print("Access token rejected, authorizing again")
+                self.invalidate_token()
+                continue
+            response.raise_for_status()
+            with self._stats_lock:
+                self.requests_made += 1
+            return response
+
+    def _count_bytes(self, size: int) -> None:
+        with self._stats_lock:
+            self.bytes_received += size
+        if self.progress:
+            self.progress.add_bytes(size)
+
+    def _post_graphql(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        response = self._send_graphql(query, variables)
+        with TRACER.span('graphql.read') as span:
+            body = response.content
+            span.set(bytes=len(body))
+        self._count_bytes(len(body))
+        with TRACER.span('json.decode', bytes=len(body)):
+            return json.loads(body)
+
+    def _iter_response_chunks(self, response: 'requests.Response') -> Iterator[bytes]:
+        with response:
+            for chunk in response.iter_content(self.STREAM_CHUNK_SIZE):
+                if self.progress:
+                    self.progress.check_cancelled()
+                self._count_bytes(len(chunk))
+                yield chunk
+
+    def _collection_query(self, media_type: str, by_status: bool = False) -> str:
+        if by_status:
+            # One status group at a time, see iter_status_lists
+            return '''
+        query ($username: String, $type: MediaType, $status: MediaListStatus) {
+        MediaListCollection (userName: $username, type: $type, status: $status) { 
+            lists {
+                status
+                entries
+                {%s}
+            }
+        }
+        }
+        ''' % build_selection(media_type, self.formats)
+        return '''
+        query ($username: String, $type: MediaType) {
+        MediaListCollection (userName: $username, type: $type) { 
+            lists {
+                status
+                entries
+                {%s}
+            }
+        }
+        }
+        ''' % build_selection(media_type, self.formats)
+
+    def _cached_response(self, username: str, media_type: str, query: str) -> Optional[tuple]:
+        if self.response_cache is None or not self.use_cache:
+            return None
+        cached = self.response_cache.get(ResponseCache.key(username, media_type, query))
+        if cached is not None:
+            with self._stats_lock:
+                self.cache_hits += 1
+        return cached
+
+    def cached_list_size(self, username: str, media_type: str) -> Optional[int]:
+        """Entry count of a cached list that iter_anime_list would use, if any."""
+        if self.response_cache is None or not self.use_cache:
+            return None
+        cached = self.response_cache.get(ResponseCache.key(username, media_type, self._collection_query(media_type)))
+        return cached[1] if cached else None
+
+    def _iter_cached_chunks(self, body: bytes) -> Iterator[bytes]:
+        with gzip.GzipFile(fileobj=io.BytesIO(body)) as f:
+            while True:
+                chunk = f.read(self.STREAM_CHUNK_SIZE)
+                if not chunk:
+                    return
+                if self.progress:
+                    self.progress.check_cancelled()
+                yield chunk
+
+    def iter_anime_list(self, username: str, media_type: str = 'ANIME') -> Iterator[AnimeEntry]:
+        """
+        Fetch the whole list in one request, yielding entries one at a time
+        while the response is still downloading instead of building the whole
+        document. A cached response is replayed the same way, without any
+        request.
+        """
+        query = self._collection_query(media_type)
+        cached = self._cached_response(username, media_type, query)
+        if cached is not None:
+            items = TRACER.timed('json.decode', EntryStreamParser(self._iter_cached_chunks(cached[0])), 'entries')
+            return (AnimeEntry(item, media_type) for item in items)
+        variables = {'username': username, 'type': media_type}
+        if self.response_cache is None:
+            return self._stream_entries(query, variables, media_type)
+        recording = []
+        entries = self._stream_entries(query, variables, media_type, recording)
+        return self._cache_when_complete(username, media_type, query, entries, recording)
+
+    def _stream_entries(self, query: str, variables: Dict[str, Any], media_type: str,
+                        recording: Optional[List[bytes]] = None) -> Iterator[AnimeEntry]:
+        """
+        Send a list query and yield its entries while the body downloads.
+        The scheduler only retries getting the response, so if the
+        connection drops while the body is read, the request is sent again
+        (up to maxRetries times) and the entries already yielded are
+        skipped. With `recording`, a gzip copy of the last, complete, body
+        is kept there.
+        """
+        done = 0
+        attempt = 0
+        while True:
+            response = self._send_graphql(query, variables, stream=True)
+            chunks = TRACER.timed('graphql.read', self._iter_response_chunks(response), 'bytes', len)
+            if recording is not None:
+                recording.clear()
+                chunks = self._record_chunks(chunks, recording)
+            try:
+                for index, item in enumerate(TRACER.timed('json.decode', EntryStreamParser(chunks), 'entries')):
+                    if index >= done:
+                        done += 1
+                        yield AnimeEntry(item, media_type)
+                return
+            except RequestScheduler.stream_errors() as e:
+                response.close()
+                if attempt >= self.scheduler.max_retries:
+                    raise
+                delay = self.scheduler.backoff(attempt)
+                print(f"Connection dropped after {done} entries ({e}), retrying in {delay:.1f}s")
+                attempt += 1
+                self.scheduler.wait_to_retry(delay, self.progress, self.throttle_stats)
+
+    @staticmethod
+    def _record_chunks(chunks: Iterable[bytes], recording: List[bytes]) -> Iterator[bytes]:
+        """Pass chunks through while keeping a gzip-compressed copy in `recording`."""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip container
+        for chunk in chunks:
+            recording.append(compressor.compress(chunk))
+            yield chunk
+        recording.append(compressor.flush())
+
+    def _cache_when_complete(self, username: str, media_type: str, query: str,
+                             entries: Iterator[AnimeEntry], recording: List[bytes]) -> Iterator[AnimeEntry]:
+        count = 0
+        for entry in entries:
+            count += 1
+            yield entry
+        # Only complete responses without GraphQL errors get this far
+        self.response_cache.put(ResponseCache.key(username, media_type, query), username, media_type,
+                                b''.join(recording), count)
+
+    def iter_status_lists(self, username: str, media_type: str = 'ANIME') -> Iterator[Iterator[AnimeEntry]]:
+        """
+        Fetch the list one status group at a time (AnimeStatus.ALL), each as
+        its own streamed request. A group is only requested once the one
+        before it has been read to the end, so a dropped connection costs
+        one group and never more than one response is open.
+        """
+        for status in AnimeStatus.ALL:
+            yield self.fetch_status_list(username, media_type, status)
+
+    def fetch_status_list(self, username: str, media_type: str, status: str) -> Iterator[AnimeEntry]:
+        """Request one status group of the list; its entries are parsed as they are read."""
+        query = self._collection_query(media_type, by_status=True)
+        variables = {'username': username, 'type': media_type, 'status': status}
+        yield from self._stream_entries(query, variables, media_type)
+        if self.progress:
+            self.progress.add_page()
+
+    def fetch_list_count(self, username: str, media_type: str) -> int:
+        """Number of entries on a list, from the user's statistics (a tiny query)."""
+        field = 'manga' if media_type == 'MANGA' else 'anime'
+        query = '''
+        query ($username: String) {
+        User (name: $username) { statistics { %s { statuses { count } } } }
+        }
+        ''' % field
+        data = self._post_graphql(query, {'username': username})['data']
+        return sum(status['count'] for status in data['User']['statistics'][field]['statuses'])
+
+    def fetch_list_state(self, username: str, media_type: str) -> List[int]:
+        """
+        A cheap fingerprint of a list, in one small request: the newest
+        updatedAt and the number of entries. Editing or adding an entry
+        changes the first, removing one the second.
+        """
+        field = 'manga' if media_type == 'MANGA' else 'anime'
+        query = '''
+        query ($username: String, $type: MediaType) {
+        Page (perPage: 1) { mediaList (userName: $username, type: $type, sort: UPDATED_TIME_DESC) { updatedAt } }
+        User (name: $username) { statistics { %s { statuses { count } } } }
+        }
+        ''' % field
+        data = self._post_graphql(query, {'username': username, 'type': media_type})['data']
+        newest = data['Page']['mediaList']
+        count = sum(status['count'] for status in data['User']['statistics'][field]['statuses'])
+        return [newest[0]['updatedAt'] if newest else 0, count]
+
+    def fetch_list_page(self, username: str, media_type: str, page: int,
+                        sort: Iterable[str] = ('STATUS', 'MEDIA_ID')) -> Dict[str, Any]:
+        query = '''
+        query ($username: String, $type: MediaType, $page: Int, $perPage: Int, $sort: [MediaListSort]) {
+        Page (page: $page, perPage: $perPage) {
+            pageInfo { currentPage hasNextPage }
+            mediaList (userName: $username, type: $type, sort: $sort)
+            {%s}
+        }
+        }
+        ''' % build_selection(media_type, self.formats)
+        
+        variables = {'username': username, 'type': media_type, 'page': page,
+                     'perPage': self.PAGE_SIZE, 'sort': list(sort)}
+        result = self._post_graphql(query, variables)['data']['Page']
+        if self.progress:
+            self.progress.add_page()
+        return result
+
+    def iter_list_pages(self, username: str, media_type: str = 'ANIME',
+                        concurrency: Optional[int] = None, start_page: int = 1) -> Iterator[List[AnimeEntry]]:
+        """
+        Fetch the list one page at a time from `start_page`, keeping up to
+        `concurrency` page requests in flight. Pages are yielded in order as
+        soon as they and every page before them have arrived.
+        """
+        concurrency = max(1, concurrency or self.config.page_concurrency)
+        
+        # The first page runs on its own so the OAuth flow happens only once
+        first = self.fetch_list_page(username, media_type, start_page)
+        yield [AnimeEntry(item, media_type) for item in first['mediaList']]
+        if not first['pageInfo']['hasNextPage']:
+            return
+        
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending = deque()
+            next_page = start_page + 1
+            for _ in range(concurrency):
+                pending.append(pool.submit(self.fetch_list_page, username, media_type, next_page))
+                next_page += 1
+            
+            try:
+                while pending:
+                    page = pending.popleft().result()
+                    if page['mediaList']:
+                        yield [AnimeEntry(item, media_type) for item in page['mediaList']]
+                    if not page['pageInfo']['hasNextPage']:
+                        break
+                    pending.append(pool.submit(self.fetch_list_page, username, media_type, next_page))
+                    next_page += 1
+            finally:
+                # Pages past the end (or abandoned on error) are not needed
+                for future in pending:
+                    future.cancel()
+
+    def _lookup_media(self, ids: List[int], key: str, media_type: Optional[str] = None) -> Dict[int, Optional[int]]:
+        """
+        Map many media IDs of one kind (`key`: 'id' or 'idMal') to the other.
+        Each request packs several aliased Page blocks of PAGE_SIZE IDs;
+        media Anilist doesn't know map to None.
+        """
+        other = 'idMal' if key == 'id' else 'id'
+        result: Dict[int, Optional[int]] = {media_id: None for media_id in ids}
+        per_request = self.PAGE_SIZE * self.ID_PAGES_PER_REQUEST
+        for start in range(0, len(ids), per_request):
+            batch = ids[start:start + per_request]
+            pages = [batch[i:i + self.PAGE_SIZE] for i in range(0, len(batch), self.PAGE_SIZE)]
+            declarations = [f'$ids{i}: [Int]' for i in range(len(pages))]
+            type_filter = ''
+            if media_type is not None:
+                declarations.insert(0, '$type: MediaType')
+                type_filter = ', type: $type'
+            query = 'query (%s) { %s }' % (
+                ', '.join(declarations),
+                ' '.join(f'p{i}: Page (perPage: {self.PAGE_SIZE}) {{ media ({key}_in: $ids{i}{type_filter}) '
+                         f'{{ id idMal }} }}' for i in range(len(pages))))
+            variables: Dict[str, Any] = {f'ids{i}': page for i, page in enumerate(pages)}
+            if media_type is not None:
+                variables['type'] = media_type
+            data = self._post_graphql(query, variables)['data']
+            for page in data.values():
+                for media in page['media']:
+                    result[media[key]] = media[other]
+        return result
+
+    def fetch_mal_ids(self, media_ids: List[int]) -> Dict[int, Optional[int]]:
+        """Look up current MAL IDs for many Anilist media at once."""
+        return self._lookup_media(media_ids, 'id')
+
+    def fetch_media_ids(self, mal_ids: List[int], media_type: str) -> Dict[int, Optional[int]]:
+        """
+        The reverse of fetch_mal_ids: Anilist media IDs for MAL IDs, which
+        are only unique per media type.
+        """
+        return self._lookup_media(mal_ids, 'idMal', media_type)
+
+    @staticmethod
+    def _mutation_arguments(fields: Dict[str, Any]) -> str:
+        """GraphQL arguments for SaveMediaListEntry; only ints, dates and list statuses are allowed."""
+        arguments = []
+        for name, value in fields.items():
+            if name == 'status':
+                if value not in AnimeStatus.ALL:
+                    raise ValueError(f"Unknown list status {value!r}")
+            elif isinstance(value, dict):
+                value = '{%s}' % ', '.join(f'{key}: {int(part)}' for key, part in value.items())
+            else:
+                value = int(value)
+            arguments.append(f'{name}: {value}')
+        return ', '.join(arguments)
+
+    def save_list_entries(self, entries: List[Dict[str, Any]]) -> Dict[int, Optional[str]]:
+        """
+        Save list entries (SaveMediaListEntry arguments, each with a
+        mediaId) with MUTATIONS_PER_REQUEST aliased mutations per request.
+        Returns an error message, or None if saved, per media ID.
+        """
+        result: Dict[int, Optional[str]] = {}
+        for start in range(0, len(entries), self.MUTATIONS_PER_REQUEST):
+            batch = entries[start:start + self.MUTATIONS_PER_REQUEST]
+            query = 'mutation { %s }' % ' '.join(
+                f'e{i}: SaveMediaListEntry ({self._mutation_arguments(fields)}) {{ id }}'
+                for i, fields in enumerate(batch))
+            # Saving the same values twice changes nothing, so the scheduler may retry it
+            document = self._post_graphql(query, {})
+            errors = {}
+            for error in document.get('errors') or []:
+                if not error.get('path'):
+                    raise ValueError(f"Anilist returned an error: {error.get('message')}")
+                errors[error['path'][0]] = error.get('message', 'failed')
+            data = document.get('data') or {}
+            for i, fields in enumerate(batch):
+                alias = f'e{i}'
+                if alias in errors or not data.get(alias):
+                    result[fields['mediaId']] = errors.get(alias, 'not saved')
+                else:
+                    result[fields['mediaId']] = None
+            if self.progress:
+                self.progress.add_entries(len(batch))
+                self.progress.check_cancelled()
+        return result
+
+    def iter_updated_entries(self, username: str, media_type: str, since: int) -> Iterator[AnimeEntry]:
+        """
+        Yield list entries, most recently updated first, until reaching
+        entries last updated before `since` (a Unix timestamp).
+        """
+        page = 1
+        while True:
+            result = self.fetch_list_page(username, media_type, page, sort=('UPDATED_TIME_DESC',))
+            for item in result['mediaList']:
+                # Entries updated in the same second as the last sync are
+                # fetched again; merging them is harmless
+                if (item['updatedAt'] or 0) < since:
+                    return
+                yield AnimeEntry(item, media_type)
+            if not result['pageInfo']['hasNextPage']:
+                return
+            page += 1
+
+
+def escape(text: str) -> str:
+    """Escape &, < and > in XML text, as xml.sax.saxutils does without importing urllib.request."""
+    return text.replace('&', '&amp;').replace('>', '&gt;').replace('<', '&lt;')
+
+
+class MALExporter:
+    XML_HEADER = '''<?xml version="1.0" encoding="UTF-8" ?>
+    <!--
+     Created by XML Export feature at MyAnimeList.net
+     Programmed by Xinil
+     Last updated 5/27/2008
+    -->
+
+    <myanimelist>
+
+      <myinfo>
+        <user_id>123456</user_id>
+        <user_name>{username}</user_name>
+        <user_export_type>1</user_export_type>
+        <user_total_anime>{stats.total_anime}</user_total_anime>
+        <user_total_watching>{stats.total_watching}</user_total_watching>
+        <user_total_completed>{stats.total_completed}</user_total_completed>
+        <user_total_onhold>{stats.total_onhold}</user_total_onhold>
+        <user_total_dropped>{stats.total_dropped}</user_total_dropped>
+        <user_total_plantowatch>{stats.total_plantowatch}</user_total_plantowatch>
+      </myinfo>
+
+'''
+    XML_FOOTER = '      </myanimelist>'
+    ENTRY_TEMPLATE = (
+        '        <anime>\n'
+        '          <series_animedb_id>{id_mal}</series_animedb_id>\n'
+        '          <series_episodes>{episodes}</series_episodes>\n'
+        '          <my_watched_episodes>{progress}</my_watched_episodes>\n'
+        '          <my_score>{score}</my_score>\n'
+        '          <my_status>{status}</my_status>\n'
+        '          <my_start_date>{start_date}</my_start_date>\n'
+        '          <my_finish_date>{end_date}</my_finish_date>\n'
+        '          <my_times_watched>{repeat}</my_times_watched>\n'
+        '          <update_on_import>1</update_on_import>\n'
+        '        </anime>\n\n'
+    )
+    WRITE_BUFFER_SIZE = 1 << 16
+
+    @staticmethod
+    def format_date(date_data: Dict[str, Any]) -> str:
+        if date_data["year"] is not None:
+            return f"{date_data['year']}-{date_data['month']}-{date_data['day']}"
+        return "0000-00-00"
+
+    @staticmethod
+    def format_entry(entry: AnimeEntry, media_type: str) -> str:
+        return MALExporter.ENTRY_TEMPLATE.format(
+            id_mal=escape(str(entry.id_mal)),
+            episodes=escape(str(entry.episodes)),
+            progress=escape(str(entry.progress)),
+            score=escape(str(entry.score)),
+            status=escape(AnimeStatus.to_mal_status(entry.status, media_type)),
+            start_date=escape(entry.started_at),
+            end_date=escape(entry.completed_at),
+            repeat=escape(str(entry.repeat)),
+        )
+
+    @staticmethod
+    def write_outputs(chunks: Iterable[Iterable[AnimeEntry]], username: str, media_type: str,
+                      outputs: Dict[str, str], progress: Optional[ExportProgress] = None,
+                      diff_index: Optional['MALXmlIndex'] = None) -> UserStats:
+        """Write the same entries to every format in `outputs` (see output_filenames)."""
+        with TRACER.span('write', profile=True, outputs=len(outputs)) as span:
+            with open_writer(outputs, username, media_type, progress, diff_index) as writer:
+                for entries in chunks:
+                    # Time spent waiting for entries is the fetch, not the write
+                    writer.write_entries(TRACER.timed('fetch', entries, 'entries'))
+            span.set(entries=writer.stats.total_anime)
+        return writer.stats
+
+
+class EntryWriter:
+    """
+    Base for output sinks that receive entries in chunks. Subclasses format
+    single entries in write_entry(); counting, progress updates and
+    cancellation checks happen here. A file whose name ends in .gz is
+    gzip-compressed. Output is only moved into place by close(), so a
+    failed or cancelled export never leaves a partial file behind.
+    """
+    # Entries written between progress updates and cancellation checks
+    PROGRESS_STEP = 256
+    GZIP_LEVEL = 6
+    # MAL silently drops entries without a MAL ID on import, so files meant
+    # for it leave them out; archive formats keep every entry
+    MAL_IDS_ONLY = False
+
+    def __init__(self, filename: str, username: str, media_type: str,
+                 progress: Optional[ExportProgress] = None):
+        self.filename = filename
+        self.username = username
+        self.media_type = media_type
+        self.progress = progress
+        self.stats = UserStats()
+
+    def open_output(self, path: str, newline: Optional[str] = None):
+        """Open `path` for writing text, compressed if `filename` ends in .gz."""
+        if self.filename.lower().endswith('.gz'):
+            return gzip.open(path, 'wt', encoding='utf-8', newline=newline, compresslevel=self.GZIP_LEVEL)
+        return open(path, 'w', encoding='utf-8', newline=newline, buffering=MALExporter.WRITE_BUFFER_SIZE)
+
+    def add(self, entry: AnimeEntry) -> None:
+        if self.MAL_IDS_ONLY and entry.id_mal is None:
+            return
+        self.stats.add(entry.status)
+        self.write_entry(entry)
+
+    def write_entry(self, entry: AnimeEntry) -> None:
+        raise NotImplementedError
+
+    def write_entries(self, entries: Iterable[AnimeEntry]) -> None:
+        pending = 0
+        for entry in entries:
+            self.add(entry)
+            pending += 1
+            if self.progress and pending == self.PROGRESS_STEP:
+                self.progress.add_entries(pending)
+                self.progress.check_cancelled()
+                pending = 0
+        if self.progress and pending:
+            self.progress.add_entries(pending)
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def discard(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            with TRACER.span('write.finish', profile=True, file=self.filename):
+                self.close()
+        else:
+            self.discard()
+
+
+class MALXmlWriter(EntryWriter):
+    """
+    Writes MAL XML for entries that arrive in chunks, before the <myinfo>
+    totals are known. Entries are spooled to a temporary file next to the
+    output while they are counted; the header and body are joined into a
+    .tmp file on close, which then replaces the output.
+    """
+    MAL_IDS_ONLY = True
+
+    def __init__(self, filename: str, username: str, media_type: str,
+                 progress: Optional[ExportProgress] = None):
+        super().__init__(filename, username, media_type, progress)
+        directory = os.path.dirname(os.path.abspath(filename))
+        self._body = tempfile.TemporaryFile('w+', encoding='utf-8', dir=directory,
+                                            buffering=MALExporter.WRITE_BUFFER_SIZE)
+
+    def write_entry(self, entry: AnimeEntry) -> None:
+        self._body.write(MALExporter.format_entry(entry, self.media_type))
+
+    def close(self) -> None:
+        tmp_path = self.filename + '.tmp'
+        try:
+            self._body.seek(0)
+            with self.open_output(tmp_path) as f:
+                f.write(MALExporter.XML_HEADER.format(username=escape(self.username), stats=self.stats))
+                shutil.copyfileobj(self._body, f, MALExporter.WRITE_BUFFER_SIZE)
+                f.write(MALExporter.XML_FOOTER)
+            os.replace(tmp_path, self.filename)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            self._body.close()
+
+    def discard(self) -> None:
+        self._body.close()
+
+
+class RecordWriter(EntryWriter):
+    """
+    Base for formats that write one record per entry straight to the
+    output. Records go to a temporary file that replaces `filename` on close.
+    """
+    FIELDS = AnimeEntry.__slots__
+
+    def __init__(self, filename: str, username: str, media_type: str,
+                 progress: Optional[ExportProgress] = None, newline: Optional[str] = None):
+        super().__init__(filename, username, media_type, progress)
+        self._tmp_path = filename + '.part'
+        self._file = self.open_output(self._tmp_path, newline)
+
+    def record(self, entry: AnimeEntry) -> Dict[str, Any]:
+        data = {name: getattr(entry, name) for name in self.FIELDS}
+        data['mal_status'] = AnimeStatus.to_mal_status(entry.status, self.media_type)
+        return data
+
+    def close(self) -> None:
+        self._file.close()
+        os.replace(self._tmp_path, self.filename)
+
+    def discard(self) -> None:
+        self._file.close()
+        os.remove(self._tmp_path)
+
+
+class JsonLinesWriter(RecordWriter):
+    """Writes one JSON object per entry."""
+    def write_entry(self, entry: AnimeEntry) -> None:
+        self._file.write(json.dumps(self.record(entry), ensure_ascii=False) + '\n')
+
+
+class CsvWriter(RecordWriter):
+    """Writes entries as CSV with a header row."""
+    def __init__(self, filename: str, username: str, media_type: str,
+                 progress: Optional[ExportProgress] = None):
+        super().__init__(filename, username, media_type, progress, newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.FIELDS + ('mal_status',))
+        self._writer.writeheader()
+
+    def write_entry(self, entry: AnimeEntry) -> None:
+        self._writer.writerow(self.record(entry))
+
+
+class MultiWriter(EntryWriter):
+    """
+    Passes every entry to several writers, so all requested formats are
+    written in one pass over the list.
+    """
+    def __init__(self, writers: List[EntryWriter], progress: Optional[ExportProgress] = None):
+        super().__init__(writers[0].filename, writers[0].username, writers[0].media_type, progress)
+        self.writers = writers
+
+    def write_entry(self, entry: AnimeEntry) -> None:
+        for writer in self.writers:
+            writer.add(entry)
+
+    def close(self) -> None:
+        for writer in self.writers:
+            writer.close()
+
+    def discard(self) -> None:
+        for writer in self.writers:
+            writer.discard()
+
+
+def iter_mal_xml(filename: str) -> Iterator[Dict[str, str]]:
+    """
+    Stream the <anime> or <manga> entries of a MAL XML export (.gz works
+    too) as dicts of tag text. Each element is dropped once read, so memory
+    use doesn't grow with the file.
+    """
+    from xml.etree import ElementTree
+    opener = gzip.open if filename.lower().endswith('.gz') else open
+    with opener(filename, 'rb') as f:
+        root = None
+        for event, element in ElementTree.iterparse(f, events=('start', 'end')):
+            if root is None:
+                root = element
+            if event == 'end' and element.tag in ('anime', 'manga'):
+                yield {child.tag: (child.text or '').strip() for child in element}
+                root.clear()
+
+
+class MALXmlIndex:
+    """
+    The entries of an earlier MAL XML export, keyed by series_animedb_id.
+    The file is read with iter_mal_xml, so only the compared values stay
+    in memory.
+    """
+    FIELDS = ('series_episodes', 'my_watched_episodes', 'my_score', 'my_status',
+              'my_start_date', 'my_finish_date', 'my_times_watched')
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.entries: Dict[int, tuple] = {}
+        for item in iter_mal_xml(filename):
+            try:
+                id_mal = int(item.get('series_animedb_id', ''))
+            except ValueError:
+                continue
+            self.entries[id_mal] = tuple(item.get(name, '') for name in self.FIELDS)
+
+    @staticmethod
+    def entry_values(entry: AnimeEntry, media_type: str) -> tuple:
+        """The values MALExporter.format_entry writes for FIELDS."""
+        return (str(entry.episodes), str(entry.progress), str(entry.score),
+                AnimeStatus.to_mal_status(entry.status, media_type),
+                entry.started_at, entry.completed_at, str(entry.repeat))
+
+
+class DiffWriter(EntryWriter):
+    """
+    Writes MAL XML with only the entries that are new or differ from an
+    earlier export, so re-importing to MAL only touches what changed. On
+    close a JSON summary of added, changed and removed IDs is written to
+    `summary_filename`.
+    """
+    MAL_IDS_ONLY = True
+
+    def __init__(self, filename: str, username: str, media_type: str, index: MALXmlIndex,
+                 summary_filename: str, progress: Optional[ExportProgress] = None):
+        super().__init__(filename, username, media_type, progress)
+        self.index = index
+        self.summary_filename = summary_filename
+        self.added: List[int] = []
+        self.changed: List[Dict[str, Any]] = []
+        self.unchanged = 0
+        self._seen = set()
+        self._writer = MALXmlWriter(filename, username, media_type)
+
+    def write_entry(self, entry: AnimeEntry) -> None:
+        self._seen.add(entry.id_mal)
+        values = MALXmlIndex.entry_values(entry, self.media_type)
+        old_values = self.index.entries.get(entry.id_mal)
+        if old_values is None:
+            self.added.append(entry.id_mal)
+        elif old_values != values:
+            self.changed.append({
+                'id_mal': entry.id_mal,
+                'fields': {name: [old, new] for name, old, new in zip(MALXmlIndex.FIELDS, old_values, values)
+                           if old != new}
+            })
+        else:
+            self.unchanged += 1
+            return
+        self._writer.add(entry)
+
+    def summary(self) -> Dict[str, Any]:
+        removed = [id_mal for id_mal in self.index.entries if id_mal not in self._seen]
+        return {
+            'compared_with': self.index.filename,
+            'output': self.filename,
+            'added': len(self.added),
+            'changed': len(self.changed),
+            'unchanged': self.unchanged,
+            # MAL imports can't delete entries, so these are only reported
+            'removed': len(removed),
+            'added_ids': self.added,
+            'changed_entries': self.changed,
+            'removed_ids': removed
+        }
+
+    def close(self) -> None:
+        self._writer.close()
+        summary = self.summary()
+        with open(self.summary_filename, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=4)
+        print(f"Compared with {self.index.filename}: {summary['added']} added, {summary['changed']} changed, "
+              f"{summary['unchanged']} unchanged, {summary['removed']} no longer listed; "
+              f"written to {self.filename}")
+
+    def discard(self) -> None:
+        self._writer.discard()
+
+
+# Output formats by name; adding .gz to a name compresses the file
+OUTPUT_FORMATS = {
+    'xml': MALXmlWriter,
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+}
+
+
+def output_format_names() -> List[str]:
+    return [name + suffix for name in OUTPUT_FORMATS for suffix in ('', '.gz')]
+
+
+def base_format(output_format: str) -> str:
+    """The OUTPUT_FORMATS name for a format with or without .gz."""
+    return output_format[:-3] if output_format.endswith('.gz') else output_format
+
+
+def format_for_filename(filename: str) -> str:
+    """Guess the output format from a file extension, defaulting to XML."""
+    name = filename.lower()
+    suffix = '.gz' if name.endswith('.gz') else ''
+    _, ext = os.path.splitext(name[:len(name) - len(suffix)])
+    return (ext[1:] if ext[1:] in OUTPUT_FORMATS else 'xml') + suffix
+
+
+def output_filenames(filename: str, formats: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """
+    Map each output format to the file it is written to. Without `formats`,
+    `filename` is used as is and its extension picks the format; otherwise
+    each format gets `filename` with its own extension.
+    """
+    formats = list(formats or [])
+    if not formats:
+        return {format_for_filename(filename): filename}
+    root = filename
+    if root.lower().endswith('.gz'):
+        root = root[:-3]
+    base, ext = os.path.splitext(root)
+    if ext[1:].lower() in OUTPUT_FORMATS:
+        root = base
+    return {output_format: f"{root}.{output_format}" for output_format in formats}
+
+
+def open_writer(outputs: Dict[str, str], username: str, media_type: str,
+                progress: Optional[ExportProgress] = None,
+                diff_index: Optional[MALXmlIndex] = None) -> EntryWriter:
+    """
+    Open one writer per output (see output_filenames), fed in a single pass.
+    With `diff_index`, a DiffWriter for the first output is added as well.
+    """
+    writers = []
+    single = len(outputs) == 1 and diff_index is None
+    try:
+        for output_format, filename in outputs.items():
+            writer_class = OUTPUT_FORMATS[base_format(output_format)]
+            writers.append(writer_class(filename, username, media_type, progress if single else None))
+        if diff_index is not None:
+            filename = next(iter(outputs.values()))
+            writers.append(DiffWriter(diff_filename(filename), username, media_type, diff_index,
+                                      diff_summary_filename(filename)))
+    except Exception:
+        for writer in writers:
+            writer.discard()
+        raise
+    return writers[0] if single else MultiWriter(writers, progress)
+
+
+class ListSnapshot:
+    """
+    Local copy of a user's list, keyed by Anilist media ID, used to export
+    only what changed since the previous run. Entries removed from the list
+    on Anilist are not detected; run a full export to drop them.
+    """
+    # Bumped when the stored entry layout changes; older snapshots are rebuilt
+    VERSION = 2
+
+    def __init__(self, username: str, media_type: str, directory: str = '.'):
+        self.path = os.path.join(directory, f"snapshot_{username}_{media_type}.json".lower())
+        self.last_updated = 0
+        self.entries: Dict[int, AnimeEntry] = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.last_updated = data.get('last_updated', 0)
+                for values in data.get('entries', []):
+                    entry = AnimeEntry.from_tuple(values)
+                    self.entries[entry.media_id] = entry
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+    @property
+    def exists(self) -> bool:
+        return bool(self.entries)
+
+    def merge(self, entries: Iterable[AnimeEntry]) -> List[AnimeEntry]:
+        """Merge fetched entries and return the ones that are new or changed."""
+        changed = []
+        for entry in entries:
+            if self.entries.get(entry.media_id) != entry:
+                self.entries[entry.media_id] = entry
+                changed.append(entry)
+            self.last_updated = max(self.last_updated, entry.updated_at or 0)
+        return changed
+
+    def save(self) -> None:
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': self.VERSION,
+                'last_updated': self.last_updated,
+                'entries': [entry.astuple() for entry in self.entries.values()]
+            }, f)
+        os.replace(tmp_path, self.path)
+
+
+class ExportJournal:
+    """
+    Checkpoints of exports in progress, so an export that failed, was
+    cancelled or was closed halfway carries on where it stopped instead of
+    fetching everything again. A checkpoint (a list page or a status group)
+    is stored with its entries once it has been read completely. A retry of
+    the same export replays the checkpoints that still match their digest
+    and fetches only the rest, as long as no entry was updated on Anilist
+    since the job started and the list still has as many entries (see
+    fetch_list_state): a removed entry shifts every later page. Jobs are
+    dropped once finished, or after MAX_AGE.
+    """
+    # Journals of another layout are dropped; they only hold checkpoints
+    VERSION = 2
+    MAX_AGE = 24 * 60 * 60
+    # Anilist's updatedAt and the local clock may disagree by this much
+    CLOCK_MARGIN = 5 * 60
+    # Entries per stored part, so a big status group is never held in memory whole
+    PART_SIZE = 1000
+
+    def __init__(self, db_path: str = 'export_journal.db'):
+        self._lock = threading.Lock()
+        import sqlite3
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        with self._db:
+            if self._db.execute('PRAGMA user_version').fetchone()[0] != self.VERSION:
+                for table in ('job', 'checkpoint', 'part'):
+                    self._db.execute(f'DROP TABLE IF EXISTS {table}')
+                self._db.execute(f'PRAGMA user_version = {self.VERSION}')
+            self._db.execute('CREATE TABLE IF NOT EXISTS job (key TEXT PRIMARY KEY, started_at REAL NOT NULL, '
+                             'entries INTEGER NOT NULL, updated_at REAL NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS checkpoint (key TEXT, seq INTEGER, entries INTEGER NOT NULL, '
+                             'digest TEXT NOT NULL, PRIMARY KEY (key, seq))')
+            self._db.execute('CREATE TABLE IF NOT EXISTS part (key TEXT, seq INTEGER, part INTEGER, '
+                             'body BLOB NOT NULL, PRIMARY KEY (key, seq, part))')
+
+    @staticmethod
+    def key(username: str, media_type: str, fetch_mode: str, outputs: Dict[str, str],
+            fields: Iterable[str]) -> str:
+        text = json.dumps([username.lower(), media_type, fetch_mode, sorted(outputs.items()), sorted(fields)])
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _delete(self, key: str, first_seq: int = 0) -> None:
+        for table in ('checkpoint', 'part'):
+            self._db.execute(f'DELETE FROM {table} WHERE key = ? AND seq >= ?', (key, first_seq))
+
+    def open_job(self, key: str, entries: int) -> Tuple[float, int, Dict[int, int]]:
+        """
+        Start the job `key` for a list of `entries` entries, or pick it up
+        again. Returns when it was started, how many entries the list had
+        then, and the entry count per stored checkpoint. The checkpoints are
+        only valid if the list still has that many entries and none was
+        updated after `usable_before`.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            for (stale,) in self._db.execute('SELECT key FROM job WHERE updated_at < ?',
+                                             (now - self.MAX_AGE,)).fetchall():
+                self._delete(stale)
+                self._db.execute('DELETE FROM job WHERE key = ?', (stale,))
+            done = dict(self._db.execute('SELECT seq, entries FROM checkpoint WHERE key = ?', (key,)))
+            row = self._db.execute('SELECT started_at, entries FROM job WHERE key = ?', (key,)).fetchone()
+            # Without checkpoints there is nothing to pick up: start afresh
+            if row is not None and done:
+                started_at, entries = row
+            else:
+                started_at = now
+            self._db.execute('INSERT OR REPLACE INTO job VALUES (?, ?, ?, ?)', (key, started_at, entries, now))
+            return started_at, entries, done
+
+    @classmethod
+    def usable_before(cls, started_at: float) -> float:
+        """The newest updatedAt a list may have for checkpoints taken since `started_at`."""
+        return started_at - cls.CLOCK_MARGIN
+
+    def restart(self, key: str, entries: int) -> None:
+        """Forget the checkpoints of `key` and count the job as started now, with `entries` entries."""
+        now = time.time()
+        with self._lock, self._db:
+            self._delete(key)
+            self._db.execute('INSERT OR REPLACE INTO job VALUES (?, ?, ?, ?)', (key, now, entries, now))
+
+    def replay(self, key: str, seq: int) -> Optional[List[AnimeEntry]]:
+        """The entries of a checkpoint, or None if it is missing or doesn't match its digest."""
+        with self._lock:
+            row = self._db.execute('SELECT entries, digest FROM checkpoint WHERE key = ? AND seq = ?',
+                                   (key, seq)).fetchone()
+            parts = [body for (body,) in self._db.execute(
+                'SELECT body FROM part WHERE key = ? AND seq = ? ORDER BY part', (key, seq))]
+        if row is None:
+            return None
+        digest = hashlib.sha256()
+        entries = []
+        try:
+            for body in parts:
+                digest.update(body)
+                entries.extend(AnimeEntry.from_tuple(values) for values in json.loads(zlib.decompress(body)))
+            valid = digest.hexdigest() == row[1] and len(entries) == row[0]
+        except (zlib.error, ValueError):
+            valid = False
+        if not valid:
+            print(f"Checkpoint {seq} of the export journal is damaged, fetching it again")
+            return None
+        return entries
+
+    def discard(self, key: str, first_seq: int = 0) -> None:
+        """Forget the checkpoints of `key` from `first_seq` on."""
+        with self._lock, self._db:
+            self._delete(key, first_seq)
+
+    def record(self, key: str, seq: int, entries: Iterable[AnimeEntry]) -> Iterator[AnimeEntry]:
+        """
+        Pass `entries` through, storing them as they go by. The checkpoint
+        only counts once `entries` has been read to the end.
+        """
+        with self._lock, self._db:
+            for table in ('checkpoint', 'part'):
+                self._db.execute(f'DELETE FROM {table} WHERE key = ? AND seq = ?', (key, seq))
+        digest = hashlib.sha256()
+        count = 0
+        part = []
+        parts = 0
+
+        def flush():
+            body = zlib.compress(json.dumps([entry.astuple() for entry in part]).encode('utf-8'), 1)
+            digest.update(body)
+            with self._lock, self._db:
+                self._db.execute('INSERT INTO part VALUES (?, ?, ?, ?)', (key, seq, parts, body))
+
+        for entry in entries:
+            part.append(entry)
+            count += 1
+            if len(part) >= self.PART_SIZE:
+                flush()
+                parts += 1
+                part = []
+            yield entry
+        if part:
+            flush()
+        with self._lock, self._db:
+            self._db.execute('INSERT INTO checkpoint VALUES (?, ?, ?, ?)', (key, seq, count, digest.hexdigest()))
+            self._db.execute('UPDATE job SET updated_at = ? WHERE key = ?', (time.time(), key))
+
+    def finish(self, key: str) -> None:
+        with self._lock, self._db:
+            self._delete(key)
+            self._db.execute('DELETE FROM job WHERE key = ?', (key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class MalIdResolver:
+    """
+    Collects the entries without a MAL ID in `unresolved`; the MAL XML
+    writers leave those out (see EntryWriter.MAL_IDS_ONLY). An entry taken
+    from an older snapshot may have gained a MAL ID on Anilist since, so
+    those (`stale_ids`) are looked up in the mapping cache or, for cache
+    misses, in batched Anilist lookups. Entries fetched just now already
+    carry Anilist's current idMal and are never looked up again.
+    """
+    BATCH_SIZE = 200
+
+    def __init__(self, anilist_service: AnilistService, cache: Optional[IdMappingCache] = None):
+        self.anilist_service = anilist_service
+        self.cache = cache
+        self.unresolved: List[AnimeEntry] = []
+
+    def resolve(self, entries: Iterable[AnimeEntry], stale_ids: Container[int] = ()) -> Iterator[AnimeEntry]:
+        """Yield every entry, with the MAL IDs found filled in; resolved ones are copies, `entries` is left as is."""
+        pending = []
+        for entry in entries:
+            if entry.id_mal is not None:
+                yield entry
+                continue
+            if self.cache is None or entry.media_id not in stale_ids:
+                self.unresolved.append(entry)
+                yield entry
+                continue
+            pending.append(entry)
+            if len(pending) >= self.BATCH_SIZE:
+                yield from self._resolve_batch(pending)
+                pending = []
+        if pending:
+            yield from self._resolve_batch(pending)
+
+    def _resolve_batch(self, entries: List[AnimeEntry]) -> Iterator[AnimeEntry]:
+        media_ids = list({entry.media_id for entry in entries if entry.media_id is not None})
+        mappings = self.cache.get_many(media_ids)
+        misses = [media_id for media_id in media_ids if media_id not in mappings]
+        if misses:
+            with TRACER.span('resolve_mal_ids', entries=len(misses)):
+                fetched = self.anilist_service.fetch_mal_ids(misses)
+            self.cache.put_many(fetched)
+            mappings.update(fetched)
+        for entry in entries:
+            id_mal = mappings.get(entry.media_id)
+            if id_mal is None:
+                self.unresolved.append(entry)
+                yield entry
+            else:
+                resolved = AnimeEntry.from_tuple(entry.astuple())
+                resolved.id_mal = id_mal
+                yield resolved
+
+    def write_report(self, filename: str) -> None:
+        """Write the entries that could not be exported, one JSON object per line."""
+        with open(filename, 'w', encoding='utf-8') as f:
+            for entry in self.unresolved:
+                f.write(json.dumps({name: getattr(entry, name) for name in AnimeEntry.__slots__}) + '\n')
+
+
+def _split_extension(filename: str) -> tuple:
+    """Like os.path.splitext, but keeps .xml.gz style extensions together."""
+    root, ext = os.path.splitext(filename)
+    if ext.lower() == '.gz':
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return root, ext
+
+
+def unresolved_filename(filename: str) -> str:
+    root, _ = _split_extension(filename)
+    return f"{root}_unresolved.jsonl"
+
+
+def skipped_filename(filename: str) -> str:
+    root, _ = _split_extension(filename)
+    return f"{root}_skipped.jsonl"
+
+
+def changes_filename(filename: str) -> str:
+    root, ext = _split_extension(filename)
+    return f"{root}_changes{ext or '.xml'}"
+
+
+def diff_filename(filename: str) -> str:
+    # Always XML: the diff is meant for importing to MAL
+    root, _ = _split_extension(filename)
+    return f"{root}_diff.xml"
+
+
+def diff_summary_filename(filename: str) -> str:
+    root, _ = _split_extension(filename)
+    return f"{root}_diff.json"
+
+
+def export_incremental(anilist_service: AnilistService, username: str, media_type: str,
+                       filename: str = "./MAL.xml", resolver: Optional[MalIdResolver] = None,
+                       progress: Optional[ExportProgress] = None,
+                       outputs: Optional[Dict[str, str]] = None,
+                       diff_index: Optional[MALXmlIndex] = None) -> int:
+    """
+    Update the local snapshot with entries changed on Anilist since the last
+    run, then write the full list to `filename` (or every file in `outputs`)
+    and only the new or changed entries next to it (see changes_filename).
+    Returns the number of changes.
+    """
+    outputs = outputs or output_filenames(filename)
+    if 'snapshot' not in anilist_service.formats:
+        anilist_service.formats = tuple(anilist_service.formats) + ('snapshot',)
+    snapshot = ListSnapshot(username, media_type, os.path.dirname(os.path.abspath(filename)))
+    if snapshot.exists:
+        fetched = anilist_service.iter_updated_entries(username, media_type, snapshot.last_updated)
+    else:
+        fetched = (item for page in anilist_service.iter_list_pages(username, media_type) for item in page)
+    fetched_ids = set()
+
+    def track(entries: Iterable[AnimeEntry]) -> Iterator[AnimeEntry]:
+        for entry in entries:
+            fetched_ids.add(entry.media_id)
+            yield entry
+
+    changed = snapshot.merge(track(fetched))
+    
+    entries = snapshot.entries.values()
+    if resolver:
+        # Only entries kept from the snapshot can have gained a MAL ID since
+        entries = list(resolver.resolve(entries, snapshot.entries.keys() - fetched_ids))
+    MALExporter.write_outputs([entries], username, media_type, outputs, progress, diff_index)
+    changes = {output_format: changes_filename(path) for output_format, path in outputs.items()}
+    MALExporter.write_outputs([changed], username, media_type, changes)
+    snapshot.save()
+    return len(changed)
+
+
+def journaled_pages(anilist_service: AnilistService, journal: ExportJournal, key: str,
+                    done: Dict[int, int], username: str, media_type: str) -> Iterator[Iterable[AnimeEntry]]:
+    """List pages for paged mode: stored ones from the journal, then the rest from Anilist."""
+    page = 1
+    while page in done:
+        entries = journal.replay(key, page)
+        if entries is None:
+            break
+        yield entries
+        page += 1
+    # Pages after a gap may have shifted, so they are fetched again as well
+    journal.discard(key, page)
+    for number, entries in enumerate(anilist_service.iter_list_pages(username, media_type, start_page=page), page):
+        yield journal.record(key, number, entries)
+
+
+def journaled_status_groups(anilist_service: AnilistService, journal: ExportJournal, key: str,
+                            done: Dict[int, int], username: str,
+                            media_type: str) -> Iterator[Iterable[AnimeEntry]]:
+    """Status groups for status mode: each from the journal if stored, or else from Anilist."""
+    for seq, status in enumerate(AnimeStatus.ALL):
+        entries = journal.replay(key, seq) if seq in done else None
+        if entries is None:
+            entries = journal.record(key, seq, anilist_service.fetch_status_list(username, media_type, status))
+        yield entries
+
+
+def run_export(anilist_service: AnilistService, username: str, media_type: str,
+               filename: str = "./MAL.xml", id_cache: Optional[IdMappingCache] = None,
+               progress: Optional[ExportProgress] = None,
+               formats: Optional[Iterable[str]] = None,
+               diff_against: Optional[str] = None,
+               use_cache: bool = False,
+               journal: Optional[ExportJournal] = None) -> Dict[str, str]:
+    """
+    Fetch a list and write it to `filename` using the configured fetch mode.
+    `formats` writes the list in each of those formats in one pass (see
+    output_filenames); by default the extension of `filename` picks it.
+    With `diff_against`, an earlier MAL XML export, only the entries added
+    or changed since then are also written to diff_filename(filename).
+    In collection mode a list downloaded within cacheTtl seconds is reused
+    from the response cache if `use_cache` is set. In paged and status
+    mode the export is checkpointed in `journal` (with resumeExports, an
+    ExportJournal of its own by default), so running it again after a
+    failure only fetches what is missing.
+    With `progress`, counters are updated as the export runs and it can be
+    cancelled, raising ExportCancelled. Returns the files written by format.
+    """
+    outputs = output_filenames(filename, formats)
+    filename = next(iter(outputs.values()))
+    # Read the old export first: it may be the file about to be replaced
+    diff_index = MALXmlIndex(diff_against) if diff_against else None
+    # Only download the fields the requested formats use
+    used_formats = [base_format(output_format) for output_format in outputs]
+    if diff_index is not None:
+        used_formats.append('xml')
+    anilist_service.formats = tuple(dict.fromkeys(used_formats))
+    anilist_service.progress = progress
+    anilist_service.use_cache = use_cache
+    fetch_mode = anilist_service.config.fetch_mode
+    config = anilist_service.config
+    own_response_cache = (fetch_mode == 'collection' and anilist_service.response_cache is None
+                          and config.cache_ttl > 0)
+    if own_response_cache:
+        anilist_service.response_cache = ResponseCache(config.local_path('response_cache.db'), config.cache_ttl,
+                                                       config.cache_size * 1024 * 1024)
+    journaled = fetch_mode in ('paged', 'status') and config.resume_exports
+    own_journal = journaled and journal is None
+    if own_journal:
+        journal = ExportJournal(config.local_path('export_journal.db'))
+    with TRACER.span('export', username=username, media_type=media_type, mode=fetch_mode):
+        list_state = None
+        if journaled:
+            key = ExportJournal.key(username, media_type, fetch_mode, outputs, anilist_service.formats)
+            try:
+                # Checkpoints are only reused if nothing was edited, added or removed since they were taken
+                list_state = anilist_service.fetch_list_state(username, media_type)
+                started_at, listed, done = journal.open_job(key, list_state[1])
+                if done and (list_state[0] >= ExportJournal.usable_before(started_at) or list_state[1] != listed):
+                    print("The list changed since the interrupted export, starting over")
+                    journal.restart(key, list_state[1])
+                    done = {}
+            except Exception:
+                if own_journal:
+                    journal.close()
+                raise
+            if done:
+                print(f"Resuming export: {len(done)} checkpoint(s) with {sum(done.values())} entries "
+                      f"already fetched")
+        if progress:
+            # A cached list knows its size, so no request is needed at all
+            cached_size = anilist_service.cached_list_size(username, media_type) if fetch_mode == 'collection' else None
+            try:
+                if list_state is not None:
+                    progress.total_entries = list_state[1]
+                elif cached_size is not None:
+                    progress.total_entries = cached_size
+                else:
+                    progress.total_entries = anilist_service.fetch_list_count(username, media_type)
+            except ExportCancelled:
+                raise
+            except Exception as e:
+                # Only used for the ETA, so carry on without it
+                print(f"Could not get the list size: {e}")
+        # Only incremental exports reuse entries old enough to need MAL ID lookups
+        own_cache = id_cache is None and fetch_mode == 'incremental'
+        if own_cache:
+            id_cache = IdMappingCache(config.local_path('id_mapping.db'))
+        resolver = MalIdResolver(anilist_service, id_cache if fetch_mode == 'incremental' else None)
+        try:
+            if fetch_mode == 'incremental':
+                # Fetch only what changed since the last export
+                changed = export_incremental(anilist_service, username, media_type, filename, resolver, progress,
+                                             outputs, diff_index)
+                print(f"{changed} new or changed entries written to {changes_filename(filename)}")
+            else:
+                if fetch_mode == 'status':
+                    # One status group per request, each written out before the next is fetched
+                    if journaled:
+                        groups = journaled_status_groups(anilist_service, journal, key, done, username, media_type)
+                    else:
+                        groups = anilist_service.iter_status_lists(username, media_type)
+                    chunks = (resolver.resolve(group) for group in groups)
+                elif fetch_mode == 'paged':
+                    # Fetch page by page and write each page as it arrives
+                    if journaled:
+                        pages = journaled_pages(anilist_service, journal, key, done, username, media_type)
+                    else:
+                        pages = anilist_service.iter_list_pages(username, media_type)
+                    chunks = [resolver.resolve(entry for page in pages for entry in page)]
+                else:
+                    # Parse entries while the list downloads and write each one straight away
+                    chunks = [resolver.resolve(anilist_service.iter_anime_list(username, media_type))]
+                MALExporter.write_outputs(chunks, username, media_type, outputs, progress, diff_index)
+                if journaled:
+                    journal.finish(key)
+        finally:
+            if own_cache:
+                resolver.cache.close()
+            if own_journal:
+                journal.close()
+            if own_response_cache:
+                anilist_service.response_cache.close()
+                anilist_service.response_cache = None
+    
+    if resolver.unresolved and 'xml' in used_formats:
+        resolver.write_report(unresolved_filename(filename))
+        print(f"{len(resolver.unresolved)} entries have no MAL ID and were left out of the MAL XML, "
+              f"see {unresolved_filename(filename)}")
+    print(f"Downloaded {anilist_service.payload_report()}")
+    return outputs
+
+
+class MALImporter:
+    """
+    Imports a MAL XML export, like the files this app writes, into the
+    authorized user's Anilist list. Entries are read one at a time and, per
+    BATCH_SIZE, their MAL IDs are looked up on Anilist in bulk and they are
+    saved with aliased SaveMediaListEntry mutations, many per request, paced
+    by the request scheduler. Entries that can't be imported are kept in
+    `skipped` with the reason; `failed` counts those Anilist rejected, as
+    opposed to ones that could not be matched to an Anilist title.
+    """
+    BATCH_SIZE = 200
+
+    def __init__(self, anilist_service: AnilistService, media_type: str = 'ANIME', dry_run: bool = False):
+        self.anilist_service = anilist_service
+        self.media_type = media_type
+        self.dry_run = dry_run
+        self.read = 0
+        self.saved = 0
+        self.failed = 0
+        self.skipped: List[Dict[str, Any]] = []
+
+    @staticmethod
+    def parse_date(text: str) -> Optional[Dict[str, int]]:
+        """A FuzzyDateInput for a MAL date like 2021-12-1; zero parts are unknown."""
+        try:
+            parts = [int(part) for part in text.split('-')]
+        except ValueError:
+            return None
+        if len(parts) != 3 or not parts[0]:
+            return None
+        return {key: value for key, value in zip(('year', 'month', 'day'), parts) if value}
+
+    def entry_fields(self, item: Dict[str, str]) -> Dict[str, Any]:
+        """SaveMediaListEntry arguments for a MAL entry, without the mediaId."""
+        status = AnimeStatus.from_mal_status(item.get('my_status', ''), item.get('my_rewatching') == '1')
+        if status is None:
+            raise ValueError(f"unknown status {item.get('my_status')!r}")
+        fields: Dict[str, Any] = {
+            'status': status,
+            # This app writes episodes for manga too; MAL's own manga exports use chapters
+            'progress': int(item.get('my_watched_episodes') or item.get('my_read_chapters') or 0),
+            'repeat': int(item.get('my_times_watched') or item.get('my_times_read') or 0),
+        }
+        # 0 means unscored on MAL; sending it would wipe a score set on Anilist
+        score = float(item.get('my_score') or 0)
+        if score:
+            # Anilist's 100-point scale, whatever format the user picked
+            fields['scoreRaw'] = int(score * 10)
+        for name, tag in (('startedAt', 'my_start_date'), ('completedAt', 'my_finish_date')):
+            date = self.parse_date(item.get(tag, ''))
+            if date:
+                fields[name] = date
+        return fields
+
+    def run(self, filename: str) -> int:
+        """Import every entry of `filename`; returns how many were saved."""
+        batch = []
+        for item in iter_mal_xml(filename):
+            self.read += 1
+            id_mal = item.get('series_animedb_id') or item.get('manga_mangadb_id') or ''
+            if not id_mal.isdigit():
+                self.skipped.append({'id_mal': id_mal or None, 'reason': 'no MAL ID'})
+                continue
+            try:
+                batch.append((int(id_mal), self.entry_fields(item)))
+            except ValueError as e:
+                self.skipped.append({'id_mal': int(id_mal), 'reason': str(e)})
+                continue
+            if len(batch) >= self.BATCH_SIZE:
+                self._import_batch(batch)
+                batch = []
+        if batch:
+            self._import_batch(batch)
+        return self.saved
+
+    def _import_batch(self, batch: List[tuple]) -> None:
+        media_ids = self.anilist_service.fetch_media_ids(list({id_mal for id_mal, _ in batch}), self.media_type)
+        entries = []
+        mal_ids = {}
+        for id_mal, fields in batch:
+            media_id = media_ids.get(id_mal)
+            if media_id is None:
+                self.skipped.append({'id_mal': id_mal, 'reason': 'not found on Anilist'})
+                continue
+            mal_ids[media_id] = id_mal
+            entries.append(dict(fields, mediaId=media_id))
+        if self.dry_run:
+            self.saved += len(entries)
+            return
+        for media_id, error in self.anilist_service.save_list_entries(entries).items():
+            if error is None:
+                self.saved += 1
+            else:
+                self.failed += 1
+                self.skipped.append({'id_mal': mal_ids[media_id], 'media_id': media_id, 'reason': error})
+
+    def write_report(self, filename: str) -> None:
+        """Write the entries that were not imported, one JSON object per line."""
+        with open(filename, 'w', encoding='utf-8') as f:
+            for item in self.skipped:
+                f.write(json.dumps(item) + '\n')
+
+
+class BatchJob:
+    def __init__(self, username: str, media_type: str = 'ANIME'):
+        self.username = username
+        self.media_type = media_type
+        self.output = ''
+        self.seconds = 0.0
+        self.payload = ''
+        self.error = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'username': self.username,
+            'media_type': self.media_type,
+            'output': self.output,
+            'seconds': round(self.seconds, 3),
+            'payload': self.payload,
+            'error': self.error
+        }
+
+    def default_output(self, output_dir: str) -> str:
+        return os.path.join(output_dir, f"MAL_{self.username}_{self.media_type}.xml")
+
+
+def read_batch_jobs(path: str) -> List[BatchJob]:
+    """
+    Read export jobs, one `username[,ANIME|MANGA]` per line. Blank lines and
+    lines starting with # are ignored.
+    """
+    jobs = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            username, _, media_type = (part.strip() for part in line.partition(','))
+            jobs.append(BatchJob(username, media_type.upper() or 'ANIME'))
+    return jobs
+
+
+def run_batch(config: Config, jobs: List[BatchJob], output_dir: str = '.', workers: int = 4,
+              token_store: Optional[TokenStore] = None,
+              formats: Optional[Iterable[str]] = None, use_cache: bool = False,
+              scheduler: Optional[RequestScheduler] = None) -> List[BatchJob]:
+    """
+    Export several lists at once on a bounded thread pool. All jobs share one
+    access token and one request scheduler, so together they stay within
+    Anilist's per-minute quota. Each list is written to its own file while
+    other jobs wait on the network. A job's payload counts only its own
+    requests; the scheduler's stats hold the batch-wide totals.
+    """
+    token_store = token_store if token_store is not None else TokenStore()
+    scheduler = scheduler if scheduler is not None else RequestScheduler(config.rate_limit, config.max_retries)
+    # One connection pool for every job, so TLS connections are reused
+    http_client = HttpClient(config, max(1, workers) * max(1, config.page_concurrency))
+    id_cache = IdMappingCache(config.local_path('id_mapping.db'))
+    response_cache = (ResponseCache(config.local_path('response_cache.db'), config.cache_ttl,
+                                    config.cache_size * 1024 * 1024)
+                      if config.cache_ttl > 0 and config.fetch_mode == 'collection' else None)
+    journal = ExportJournal(config.local_path('export_journal.db')) if config.resume_exports else None
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Authorize once up front; every job then loads the token from the store
+    if not AnilistService(config, token_store=token_store, http_client=http_client).request_token():
+        raise RuntimeError("Could not get an Anilist access token")
+    
+    def run_job(job: BatchJob) -> BatchJob:
+        job.output = job.default_output(output_dir)
+        anilist_service = AnilistService(config, token_store=token_store, scheduler=scheduler,
+                                         http_client=http_client, response_cache=response_cache)
+        start = time.perf_counter()
+        try:
+            outputs = run_export(anilist_service, job.username, job.media_type, job.output, id_cache,
+                                 formats=formats, use_cache=use_cache, journal=journal)
+            job.output = ', '.join(outputs.values())
+        except Exception as e:
+            job.error = str(e)
+        job.seconds = time.perf_counter() - start
+        job.payload = anilist_service.payload_report()
+        return job
+    
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            return list(pool.map(run_job, jobs))
+    finally:
+        http_client.close()
+        id_cache.close()
+        if response_cache is not None:
+            response_cache.close()
+        if journal is not None:
+            journal.close()
+
+
+class SyncAccount:
+    """Sync state of one list, as kept in the sync status file."""
+    def __init__(self, job: BatchJob):
+        self.username = job.username
+        self.media_type = job.media_type
+        self.output = job.output
+        self.state: Optional[List[int]] = None
+        self.last_probe = 0.0
+        self.last_sync = 0.0
+        self.next_run = 0.0
+        self.exports = 0
+        self.skipped = 0
+        self.export_seconds = 0.0
+        self.seconds_saved = 0.0
+        self.error = None
+
+    TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        self.state = data.get('state')
+        if data.get('last_sync'):
+            self.last_sync = time.mktime(time.strptime(data['last_sync'], self.TIME_FORMAT))
+        self.exports = data.get('exports', 0)
+        self.skipped = data.get('skipped', 0)
+        self.export_seconds = data.get('export_seconds', 0.0)
+        self.seconds_saved = data.get('seconds_saved', 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        def timestamp(value: float) -> Optional[str]:
+            return time.strftime(self.TIME_FORMAT, time.localtime(value)) if value else None
+        return {
+            'username': self.username,
+            'media_type': self.media_type,
+            'output': self.output,
+            'state': self.state,
+            'last_probe': timestamp(self.last_probe),
+            'last_sync': timestamp(self.last_sync),
+            'next_run': timestamp(self.next_run),
+            'exports': self.exports,
+            'skipped': self.skipped,
+            'export_seconds': round(self.export_seconds, 3),
+            'seconds_saved': round(self.seconds_saved, 3),
+            'error': self.error
+        }
+
+
+class SyncDaemon:
+    """
+    Keeps the exports of several lists up to date. Every `interval` seconds
+    each list is probed with fetch_list_state, and it is only exported
+    again when that changed (or its file is missing). Probes are spread
+    evenly over the interval instead of arriving together, and all lists
+    share one request scheduler. After every probe the state of each list,
+    including the export time saved by skipping unchanged ones, is written
+    to `status_file`; a restarted daemon picks up from there.
+    """
+    def __init__(self, config: Config, jobs: List[BatchJob], output_dir: str = '.', interval: float = 900,
+                 status_file: str = 'sync_status.json', token_store: Optional[TokenStore] = None,
+                 formats: Optional[Iterable[str]] = None):
+        self.config = config
+        self.interval = interval
+        self.status_file = status_file
+        self.formats = formats
+        self.token_store = token_store if token_store is not None else TokenStore()
+        self.scheduler = RequestScheduler(config.rate_limit, config.max_retries)
+        self.stop_event = threading.Event()
+        os.makedirs(output_dir, exist_ok=True)
+        self.accounts = []
+        for job in jobs:
+            job.output = job.default_output(output_dir)
+            self.accounts.append(SyncAccount(job))
+        self._load_status()
+
+    def _load_status(self) -> None:
+        try:
+            with open(self.status_file, encoding='utf-8') as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        by_key = {(item['username'], item['media_type']): item for item in saved.get('accounts', [])}
+        for account in self.accounts:
+            item = by_key.get((account.username, account.media_type))
+            if item and item.get('output') == account.output:
+                account.restore(item)
+
+    def save_status(self) -> None:
+        status = {
+            'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'interval': self.interval,
+            'exports': sum(account.exports for account in self.accounts),
+            'skipped': sum(account.skipped for account in self.accounts),
+            'seconds_saved': round(sum(account.seconds_saved for account in self.accounts), 3),
+            'accounts': [account.to_dict() for account in self.accounts]
+        }
+        tmp_path = self.status_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(status, f, indent=4)
+        os.replace(tmp_path, self.status_file)
+
+    def sync(self, account: SyncAccount, http_client: HttpClient, id_cache: IdMappingCache) -> None:
+        """Probe one list and export it if it changed."""
+        anilist_service = AnilistService(self.config, token_store=self.token_store, scheduler=self.scheduler,
+                                         http_client=http_client)
+        start = time.perf_counter()
+        account.last_probe = time.time()
+        account.next_run = account.last_probe + self.interval
+        try:
+            state = anilist_service.fetch_list_state(account.username, account.media_type)
+            outputs = output_filenames(account.output, self.formats).values()
+            if state == account.state and all(os.path.exists(path) for path in outputs):
+                account.skipped += 1
+                account.seconds_saved += max(0.0, account.export_seconds - (time.perf_counter() - start))
+                print(f"{account.username} {account.media_type}: unchanged")
+            else:
+                export_start = time.perf_counter()
+                # The list just changed, so a cached copy of it is out of date by definition
+                run_export(anilist_service, account.username, account.media_type, account.output, id_cache,
+                           formats=self.formats, use_cache=False)
+                account.export_seconds = time.perf_counter() - export_start
+                account.state = state
+                account.last_sync = time.time()
+                account.exports += 1
+                print(f"{account.username} {account.media_type}: exported in {account.export_seconds:.1f}s")
+            account.error = None
+        except Exception as e:
+            account.error = str(e)
+            print(f"{account.username} {account.media_type}: sync failed: {e}")
+
+    def run(self, once: bool = False) -> None:
+        """Sync until stop() is called, or probe every list one time with `once`."""
+        http_client = HttpClient(self.config, self.config.page_concurrency)
+        id_cache = IdMappingCache(self.config.local_path('id_mapping.db'))
+        try:
+            if not AnilistService(self.config, token_store=self.token_store, http_client=http_client).request_token():
+                raise RuntimeError("Could not get an Anilist access token")
+            now = time.time()
+            step = 0 if once else self.interval / max(1, len(self.accounts))
+            for index, account in enumerate(self.accounts):
+                account.next_run = now + index * step
+            self.save_status()
+            
+            pending = list(self.accounts)
+            while not self.stop_event.is_set():
+                account = min(pending, key=lambda item: item.next_run)
+                delay = account.next_run - time.time()
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+                self.sync(account, http_client, id_cache)
+                if once:
+                    pending.remove(account)
+                    if not pending:
+                        break
+                self.save_status()
+        finally:
+            self.save_status()
+            http_client.close()
+            id_cache.close()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+
+# Command line interface
+FETCH_MODES = ['collection', 'paged', 'status', 'incremental']
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Export Anilist anime and manga lists to MyAnimeList XML. '
+                    'Run without arguments to open the GUI.')
+    parser.add_argument('--config', default='config.json', help='path to config.json')
+    parser.add_argument('--token-file', default='token.json', help='where the access token is cached')
+    parser.add_argument('--startup-timing', action='store_true',
+                        help='print how long the GUI took to start, phase by phase')
+    parser.add_argument('--trace', metavar='FILE', help='write timings of every export phase to FILE')
+    parser.add_argument('--trace-format', choices=Tracer.FORMATS, default='json',
+                        help='"chrome" writes a trace for chrome://tracing or Perfetto')
+    parser.add_argument('--trace-profile', action='store_true',
+                        help='also keep cProfile and tracemalloc results for the slowest phases (slower)')
+    subparsers = parser.add_subparsers(dest='command')
+    
+    export_parser = subparsers.add_parser('export', help='export one list without opening the GUI')
+    export_parser.add_argument('--username', help='Anilist username (defaults to the one in config.json)')
+    export_parser.add_argument('--type', dest='media_type', choices=['ANIME', 'MANGA'], default='ANIME')
+    export_parser.add_argument('--output', default='./MAL.xml',
+                               help='output file; its extension picks the format unless --format is given')
+    export_parser.add_argument('--format', dest='formats', nargs='+', choices=output_format_names(),
+                               help='write these formats in one pass, each with its own extension')
+    export_parser.add_argument('--cache', dest='use_cache', action='store_true',
+                               help='reuse the list if it was downloaded in the last cacheTtl seconds '
+                                    '(collection mode only)')
+    export_parser.add_argument('--diff-against', metavar='OLD_XML',
+                               help='also write only the entries added or changed since this MAL XML export')
+    export_parser.add_argument('--mode', choices=FETCH_MODES,
+                               help='fetch mode (defaults to fetchMode in config.json)')
+    
+    batch_parser = subparsers.add_parser('batch', help='export lists for many accounts at once')
+    batch_parser.add_argument('jobs', help='file with one "username[,ANIME|MANGA]" per line')
+    batch_parser.add_argument('--output-dir', default='.', help='directory for the exported files')
+    batch_parser.add_argument('--workers', type=int, default=4, help='lists exported at the same time')
+    batch_parser.add_argument('--mode', choices=FETCH_MODES,
+                              help='fetch mode (defaults to fetchMode in config.json)')
+    batch_parser.add_argument('--summary', default='batch_summary.json',
+                              help='where to write per-job timings and errors')
+    batch_parser.add_argument('--format', dest='formats', nargs='+', choices=output_format_names(),
+                              help='output formats (default xml)')
+    batch_parser.add_argument('--cache', dest='use_cache', action='store_true',
+                              help='reuse lists downloaded in the last cacheTtl seconds (collection mode only)')
+    
+    sync_parser = subparsers.add_parser(
+        'sync', help='keep exports of many lists up to date, exporting only lists that changed')
+    sync_parser.add_argument('jobs', help='file with one "username[,ANIME|MANGA]" per line')
+    sync_parser.add_argument('--output-dir', default='.', help='directory for the exported files')
+    sync_parser.add_argument('--interval', type=float, default=900,
+                             help='seconds between checks of the same list (default 900)')
+    sync_parser.add_argument('--mode', choices=FETCH_MODES,
+                             help='fetch mode for exports (defaults to fetchMode in config.json)')
+    sync_parser.add_argument('--format', dest='formats', nargs='+', choices=output_format_names(),
+                             help='output formats (default xml)')
+    sync_parser.add_argument('--status-file', default='sync_status.json',
+                             help='where to write the last sync, next run and time saved per list')
+    sync_parser.add_argument('--once', action='store_true', help='check every list once and exit')
+    
+    import_parser = subparsers.add_parser('import', help='add the entries of a MAL XML export to your Anilist list')
+    import_parser.add_argument('file', help='MAL XML file, like the ones this app or MyAnimeList exports')
+    import_parser.add_argument('--type', dest='media_type', choices=['ANIME', 'MANGA'], default='ANIME')
+    import_parser.add_argument('--dry-run', action='store_true',
+                               help='look the entries up on Anilist but don\'t change the list')
+    return parser
+
+
+def warn_unused_cache(args: argparse.Namespace, config: Config) -> None:
+    # Only whole-list downloads are cached; the other modes fetch in pieces
+    if args.use_cache and config.fetch_mode != 'collection':
+        print(f"--cache only applies to collection mode; {config.fetch_mode} mode downloads the list again",
+              file=sys.stderr)
+
+
+def command_export(args: argparse.Namespace, config: Config) -> int:
+    if args.mode:
+        config.fetch_mode = args.mode
+    warn_unused_cache(args, config)
+    username = args.username or config.username
+    if not username:
+        print("No username given and none set in config.json", file=sys.stderr)
+        return 2
+    anilist_service = AnilistService(config, token_store=TokenStore(args.token_file))
+    outputs = run_export(anilist_service, username, args.media_type, args.output, formats=args.formats,
+                         diff_against=args.diff_against, use_cache=args.use_cache)
+    print(f"Export written to {', '.join(outputs.values())}")
+    return 0
+
+
+def command_batch(args: argparse.Namespace, config: Config) -> int:
+    if args.mode:
+        config.fetch_mode = args.mode
+    warn_unused_cache(args, config)
+    jobs = read_batch_jobs(args.jobs)
+    scheduler = RequestScheduler(config.rate_limit, config.max_retries)
+    start = time.perf_counter()
+    results = run_batch(config, jobs, args.output_dir, args.workers, TokenStore(args.token_file), args.formats,
+                        args.use_cache, scheduler)
+    
+    summary = {
+        'seconds': round(time.perf_counter() - start, 3),
+        'failed': sum(1 for job in results if job.error),
+        'retries': scheduler.stats.retries,
+        'throttled_seconds': round(scheduler.stats.throttled_seconds, 3),
+        'jobs': [job.to_dict() for job in results]
+    }
+    with open(args.summary, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=4)
+    
+    for job in results:
+        outcome = f"failed: {job.error}" if job.error else f"{job.output}, {job.payload}"
+        print(f"{job.username} {job.media_type}: {job.seconds:.1f}s, {outcome}")
+    print(f"{len(results) - summary['failed']}/{len(results)} exports succeeded in {summary['seconds']}s "
+          f"(batch total: {scheduler.report()})")
+    return 1 if summary['failed'] else 0
+
+
+def command_sync(args: argparse.Namespace, config: Config) -> int:
+    if args.mode:
+        config.fetch_mode = args.mode
+    daemon = SyncDaemon(config, read_batch_jobs(args.jobs), args.output_dir, args.interval, args.status_file,
+                        TokenStore(args.token_file), args.formats)
+    try:
+        daemon.run(args.once)
+    except KeyboardInterrupt:
+        print("Sync stopped")
+    return 1 if any(account.error for account in daemon.accounts) and args.once else 0
+
+
+def command_import(args: argparse.Namespace, config: Config) -> int:
+    anilist_service = AnilistService(config, token_store=TokenStore(args.token_file))
+    importer = MALImporter(anilist_service, args.media_type, args.dry_run)
+    start = time.perf_counter()
+    saved = importer.run(args.file)
+    action = "Would import" if args.dry_run else "Imported"
+    print(f"{action} {saved}/{importer.read} entries with {anilist_service.requests_made} requests "
+          f"in {time.perf_counter() - start:.1f}s")
+    if importer.skipped:
+        report = skipped_filename(args.file)
+        importer.write_report(report)
+        print(f"{len(importer.skipped)} entries skipped ({importer.failed} rejected by Anilist), see {report}")
+    # Titles missing on either site are expected; only rejected saves are failures
+    return 1 if importer.failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.trace:
+        TRACER.configure(args.trace, args.trace_format, args.trace_profile)
+    try:
+        if args.command is None:
+            startup_timer = StartupTimer(args.startup_timing)
+            startup_timer.mark('import')
+            # Qt is only imported when the GUI is actually used
+            from gui import run_gui
+            startup_timer.mark('import gui')
+            return run_gui(startup_timer, args.config, args.token_file)
+        
+        config = Config(args.config)
+        commands = {'export': command_export, 'batch': command_batch, 'sync': command_sync,
+                    'import': command_import}
+        try:
+            return commands[args.command](args, config)
+        except Exception as e:
+            print(f"{args.command.capitalize()} failed: {e}", file=sys.stderr)
+            return 1
+    finally:
+        TRACER.save()
+
@@ -0,0 +1,168 @@
+"""
+Offline benchmarks for the export pipeline.
+
+Generates synthetic MediaListCollection payloads and times each stage of
+the conversion separately, so results can be compared between versions:
+
+    python benchmark.py --sizes 1000 10000 100000 --output benchmark_results.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from anilist_to_mal import AnimeEntry, AnimeStatus, EntryStreamParser, MALExporter, MALXmlWriter
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+
+# Roughly what real lists look like: mostly completed, some planned
+STATUS_WEIGHTS = {
+    AnimeStatus.COMPLETED: 60,
+    AnimeStatus.PLANNING: 15,
+    AnimeStatus.CURRENT: 8,
+    AnimeStatus.PAUSED: 8,
+    AnimeStatus.DROPPED: 6,
+    AnimeStatus.REPEATING: 3,
+}
+
+
+def _random_date(rng: random.Random, null_ratio: float) -> Dict[str, Any]:
+    if rng.random() < null_ratio:
+        return {'year': None, 'month': None, 'day': None}
+    return {'year': rng.randint(2000, 2024), 'month': rng.randint(1, 12), 'day': rng.randint(1, 28)}
+
+
+def generate_entry(rng: random.Random, media_id: int, status: str) -> Dict[str, Any]:
+    planning = status == AnimeStatus.PLANNING
+    units = rng.choice([None, 1, 12, 13, 24, 26, 50, 150])
+    return {
+        'status': status,
+        'progress': 0 if planning else rng.randint(0, units or 30),
+        'repeat': 1 if status == AnimeStatus.REPEATING else rng.choice([0, 0, 0, 0, 1]),
+        'score': 0 if planning else rng.randint(0, 10),
+        'startedAt': _random_date(rng, 1.0 if planning else 0.3),
+        'completedAt': _random_date(rng, 0.1 if status == AnimeStatus.COMPLETED else 0.9),
+        'updatedAt': 1600000000 + media_id,
+        'media': {
+            'id': media_id,
+            # A few titles have no MAL counterpart
+            'idMal': None if rng.random() < 0.03 else media_id + 100000,
+            'episodes': units,
+            'chapters': units,
+        },
+    }
+
+
+def generate_collection(size: int, seed: int = 0) -> Dict[str, Any]:
+    """Build a MediaListCollection response with `size` entries."""
+    rng = random.Random(seed)
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+    lists: Dict[str, List[Dict[str, Any]]] = {status: [] for status in statuses}
+    for media_id in range(1, size + 1):
+        status = rng.choices(statuses, weights)[0]
+        lists[status].append(generate_entry(rng, media_id, status))
+    return {'data': {'MediaListCollection': {'lists': [
+        {'status': status, 'entries': entries} for status, entries in lists.items() if entries
+    ]}}}
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Best wall time over `repeat` runs, then one traced run for peak memory."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': round(min(timings), 6), 'peak_kib': round(peak / 1024, 1)}
+
+
+def run_benchmarks(size: int, repeat: int, media_type: str = 'ANIME') -> Dict[str, Any]:
+    data = generate_collection(size)
+    entries = [item for group in data['data']['MediaListCollection']['lists'] for item in group['entries']]
+    dates = [item['startedAt'] for item in entries] + [item['completedAt'] for item in entries]
+    statuses = [item['status'] for item in entries]
+    payload = json.dumps(data).encode('utf-8')
+    records = [AnimeEntry(item, media_type) for item in entries]
+    chunk_size = 64 * 1024
+
+    def stream_entries():
+        # The response as it arrives in a collection export
+        chunks = (payload[i:i + chunk_size] for i in range(0, len(payload), chunk_size))
+        return (AnimeEntry(item, media_type) for item in EntryStreamParser(chunks))
+
+    def write_xml():
+        with MALXmlWriter(path, 'benchmark', media_type) as writer:
+            writer.write_entries(records)
+
+    fd, path = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+    try:
+        cases = {
+            'format_date': lambda: [MALExporter.format_date(date) for date in dates],
+            'to_mal_status': lambda: [AnimeStatus.to_mal_status(status, media_type) for status in statuses],
+            'parse_stream': lambda: sum(1 for _ in stream_entries()),
+            # MALXmlWriter alone, then the whole streamed pipeline an export runs
+            'write_xml': write_xml,
+            'export_xml': lambda: MALExporter.write_outputs([stream_entries()], 'benchmark', media_type,
+                                                            {'xml': path}),
+            # Memory of the whole list as response dicts versus as AnimeEntry records
+            'load_dicts': lambda: json.loads(payload),
+            'build_entries': lambda: [AnimeEntry(item, media_type) for item in entries],
+        }
+        results = {name: _measure(case, repeat) for name, case in cases.items()}
+        xml_size = os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+    return {
+        'entries': size,
+        'payload_kib': round(len(payload) / 1024, 1),
+        'xml_kib': round(xml_size / 1024, 1),
+        'results': results,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the Anilist to MAL export pipeline offline.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='list sizes to generate')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (best is kept)')
+    parser.add_argument('--type', dest='media_type', choices=['ANIME', 'MANGA'], default='ANIME')
+    parser.add_argument('--output', default='benchmark_results.json', help='where to write the results')
+    args = parser.parse_args(argv)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'media_type': args.media_type,
+        'runs': [],
+    }
+    for size in args.sizes:
+        run = run_benchmarks(size, args.repeat, args.media_type)
+        report['runs'].append(run)
+        for name, result in run['results'].items():
+            print(f"{size:>8} {name:<16} {result['seconds'] * 1000:>10.1f} ms {result['peak_kib']:>12.1f} KiB")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+"""
+Local stand-in for the Anilist OAuth and GraphQL endpoints.
+
+Serves list data from a fixture file or from synthetic lists (see
+benchmark.py), with optional latency, rate limiting and broken responses,
+so exports can be load-tested without a network. Point config.json at it:
+
+    python fake_anilist.py --port 8080 --size 100000 --latency 0.2
+
+    "oauthUrl": "http://127.0.0.1:8080/api/v2/oauth",
+    "graphqlUrl": "http://127.0.0.1:8080/graphql"
+"""
+import argparse
+import gzip
+import http.server
+import json
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, List
+
+from benchmark import generate_collection
+
+FAKE_CODE = 'fake-authorization-code'
+FAKE_TOKEN = 'fake-access-token'
+
+
+class FakeAnilist:
+    """List data and failure settings shared by every request handler."""
+
+    def __init__(self, collection: Dict[str, Any], latency: float = 0.0, rate_limit: int = 0,
+                 truncate_every: int = 0, drip_rate: int = 0, error_rate: float = 0.0):
+        self.lists = collection['data']['MediaListCollection']['lists']
+        self.entries = [item for group in self.lists for item in group['entries']]
+        self.media = {item['media']['id']: item['media'] for item in self.entries}
+        self.by_mal = {media['idMal']: media_id for media_id, media in self.media.items() if media['idMal']}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.truncate_every = truncate_every
+        self.drip_rate = drip_rate
+        self.error_rate = error_rate
+        self.requests = 0
+        self.saved: Dict[int, str] = {}
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self._lock = threading.Lock()
+
+    def next_request(self) -> Dict[str, int]:
+        """Count a GraphQL request against the per-minute window."""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._window_requests = 0
+            self._window_requests += 1
+            return {
+                'number': self.requests,
+                'remaining': max(0, self.rate_limit - self._window_requests),
+                'limited': bool(self.rate_limit) and self._window_requests > self.rate_limit,
+                'reset': int(time.time() + 60 - (now - self._window_start)),
+            }
+
+    def remove(self, media_id: int) -> None:
+        """Take an entry off the list, as deleting it on Anilist does."""
+        with self._lock:
+            for group in self.lists:
+                group['entries'] = [item for item in group['entries'] if item['media']['id'] != media_id]
+            self.entries = [item for item in self.entries if item['media']['id'] != media_id]
+
+    def collection(self, variables: Dict[str, Any]) -> Dict[str, Any]:
+        lists = self.lists
+        if variables.get('status'):
+            lists = [group for group in lists if group['status'] == variables['status']]
+        return {'MediaListCollection': {'lists': lists}}
+
+    def statistics(self) -> Dict[str, Any]:
+        statuses = [{'status': group['status'], 'count': len(group['entries'])} for group in self.lists]
+        return {'User': {'statistics': {'anime': {'statuses': statuses}, 'manga': {'statuses': statuses}}}}
+
+    def media_lookup(self, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer aliased `pN: Page { media(id_in: $idsN) }` lookups."""
+        return {f"p{name[3:]}": {'media': [
+            {'id': media_id, 'idMal': self.media[media_id]['idMal']} for media_id in ids if media_id in self.media
+        ]} for name, ids in variables.items() if name.startswith('ids')}
+
+    def mal_lookup(self, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer aliased `pN: Page { media(idMal_in: $idsN) }` lookups."""
+        return {f"p{name[3:]}": {'media': [
+            {'id': self.by_mal[id_mal], 'idMal': id_mal} for id_mal in ids if id_mal in self.by_mal
+        ]} for name, ids in variables.items() if name.startswith('ids')}
+
+    def save_entries(self, query: str) -> Dict[str, Any]:
+        """Answer aliased `eN: SaveMediaListEntry(mediaId: ...)` mutations, keeping the arguments."""
+        data = {}
+        for alias, arguments in re.findall(r'(\w+): SaveMediaListEntry \(([^)]*(?:\{[^}]*\}[^)]*)*)\)', query):
+            media_id = int(re.search(r'mediaId: (\d+)', arguments).group(1))
+            with self._lock:
+                self.saved[media_id] = arguments
+            data[alias] = {'id': media_id} if media_id in self.media else None
+        return data
+
+    @staticmethod
+    def inline_arguments(query: str) -> Dict[str, str]:
+        """Literal `perPage: 1` / `sort: UPDATED_TIME_DESC` style arguments written into the query."""
+        # Skip `$page: Int` style variable declarations
+        return dict(re.findall(r'(?<!\$)\b(page|perPage|sort): *\[?([A-Z_]+\b|\d+)', query))
+
+    def page(self, variables: Dict[str, Any], query: str = '') -> Dict[str, Any]:
+        inline = self.inline_arguments(query)
+        entries: List[Dict[str, Any]] = self.entries
+        sort = variables.get('sort') or [inline.get('sort')]
+        if 'UPDATED_TIME_DESC' in sort:
+            entries = sorted(entries, key=lambda item: item['updatedAt'], reverse=True)
+        page = variables.get('page', int(inline.get('page', 1)))
+        per_page = min(50, variables.get('perPage', int(inline.get('perPage', 50))))
+        start = (page - 1) * per_page
+        return {'Page': {
+            'pageInfo': {'currentPage': page, 'hasNextPage': start + per_page < len(entries)},
+            'mediaList': entries[start:start + per_page],
+        }}
+
+
+class FakeAnilistHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeAnilist/1.0'
+
+    @property
+    def fake(self) -> FakeAnilist:
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path.endswith('/oauth/authorize'):
+            # Skip the login page and send the browser straight back
+            query = urllib.parse.parse_qs(url.query)
+            params = {'code': FAKE_CODE}
+            if 'state' in query:
+                params['state'] = query['state'][0]
+            location = f"{query.get('redirect_uri', [''])[0]}?{urllib.parse.urlencode(params)}"
+            self.send_response(302)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            request = json.loads(body or b'{}')
+        except json.JSONDecodeError:
+            self._send_json(400, {'errors': [{'message': 'Invalid JSON'}]})
+            return
+
+        if self.path.endswith('/oauth/token'):
+            if request.get('code') != FAKE_CODE:
+                self._send_json(400, {'error': 'invalid_grant'})
+            else:
+                self._send_json(200, {'token_type': 'Bearer', 'expires_in': 31536000, 'access_token': FAKE_TOKEN})
+            return
+        self._graphql(request)
+
+    def _graphql(self, request: Dict[str, Any]) -> None:
+        state = self.fake.next_request()
+        headers = {'X-RateLimit-Limit': str(self.fake.rate_limit or 90),
+                   'X-RateLimit-Remaining': str(state['remaining'] if self.fake.rate_limit else 89)}
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+        if self.headers.get('Authorization') != f"Bearer {FAKE_TOKEN}":
+            self._send_json(401, {'errors': [{'message': 'Invalid token', 'status': 401}]})
+            return
+        if state['limited']:
+            headers.update({'Retry-After': str(max(1, state['reset'] - int(time.time()))),
+                            'X-RateLimit-Reset': str(state['reset'])})
+            self._send_json(429, {'errors': [{'message': 'Too Many Requests.', 'status': 429}]}, headers)
+            return
+        if self.fake.error_rate and random.random() < self.fake.error_rate:
+            self._send_json(502, {'errors': [{'message': 'Bad Gateway', 'status': 502}]}, headers)
+            return
+
+        query = request.get('query', '')
+        variables = request.get('variables') or {}
+        data = {}
+        if 'SaveMediaListEntry' in query:
+            data = self.fake.save_entries(query)
+            missing = [{'message': 'Not Found.', 'status': 404, 'path': [alias]}
+                       for alias, value in data.items() if value is None]
+            self._send_json(200, {'data': data, 'errors': missing} if missing else {'data': data}, headers)
+            return
+        # A query may combine a statistics lookup with a list page
+        if 'statistics' in query:
+            data.update(self.fake.statistics())
+        if 'idMal_in' in query:
+            data.update(self.fake.mal_lookup(variables))
+        elif 'id_in' in query:
+            data.update(self.fake.media_lookup(variables))
+        elif 'Page' in query:
+            data.update(self.fake.page(variables, query))
+        elif 'MediaListCollection' in query:
+            data.update(self.fake.collection(variables))
+        if not data:
+            self._send_json(400, {'errors': [{'message': 'Query not supported by the fake server'}]}, headers)
+            return
+
+        truncate = bool(self.fake.truncate_every) and state['number'] % self.fake.truncate_every == 0
+        self._send_json(200, {'data': data}, headers, truncate=truncate)
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Dict[str, str] = None,
+                   truncate: bool = False) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            body = gzip.compress(body, compresslevel=5)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        if truncate:
+            # Promise the full body but hang up halfway through it
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        if not self.fake.drip_rate:
+            self.wfile.write(body)
+            return
+        # Slow drip: send drip_rate bytes per second in small slices
+        step = max(1, self.fake.drip_rate // 10)
+        for start in range(0, len(body), step):
+            self.wfile.write(body[start:start + step])
+            self.wfile.flush()
+            time.sleep(step / self.fake.drip_rate)
+
+
+def make_server(fake: FakeAnilist, host: str = '127.0.0.1', port: int = 8080,
+                verbose: bool = False) -> http.server.ThreadingHTTPServer:
+    server = http.server.ThreadingHTTPServer((host, port), FakeAnilistHandler)
+    server.daemon_threads = True
+    server.fake = fake
+    server.verbose = verbose
+    return server
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Serve a fake Anilist API for offline testing.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--fixture', help='MediaListCollection response JSON to serve')
+    parser.add_argument('--size', type=int, default=1000, help='entries in the generated list (without --fixture)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every GraphQL response')
+    parser.add_argument('--rate-limit', type=int, default=0, help='GraphQL requests per minute before 429s')
+    parser.add_argument('--truncate-every', type=int, default=0, help='cut every Nth response short')
+    parser.add_argument('--drip', type=int, default=0, help='send responses at this many bytes per second')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 502')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args(argv)
+
+    if args.fixture:
+        with open(args.fixture, encoding='utf-8') as f:
+            collection = json.load(f)
+    else:
+        collection = generate_collection(args.size)
+    fake = FakeAnilist(collection, args.latency, args.rate_limit, args.truncate_every, args.drip, args.error_rate)
+
+    server = make_server(fake, args.host, args.port, args.verbose)
+    print(f"Fake Anilist serving {len(fake.entries)} entries at http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
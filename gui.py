@@ -0,0 +1,371 @@
+import sys
+from PyQt6.QtGui import QIcon
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QPushButton, QLabel, 
+                            QVBoxLayout, QHBoxLayout, QWidget, QComboBox, 
+                            QMessageBox, QProgressBar, QLineEdit, QFileDialog, QCheckBox)
+from PyQt6.QtCore import Qt, QThread, QTimer, pyqtSignal, QMutex
+
+from anilist_to_mal import (Config, AnilistService, BrowserCache, ExportCancelled, ExportProgress,
+                            StartupTimer, TokenStore, run_export)
+
+
+# Browser discovery probes the file system and PATH, so it runs off the UI thread
+class BrowserDiscoveryWorker(QThread):
+    found = pyqtSignal(list)
+    
+    def __init__(self, browser_cache):
+        super().__init__()
+        self.browser_cache = browser_cache
+    
+    def run(self):
+        try:
+            self.found.emit(self.browser_cache.discover())
+        except Exception as e:
+            print(f"Browser discovery failed: {e}")
+
+
+# Worker thread for background processing
+class ExportWorker(QThread):
+    finished = pyqtSignal(str)
+    progress = pyqtSignal(int)
+    status = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    error = pyqtSignal(str)
+    
+    def __init__(self, anilist_service, username, media_type, filename="./MAL.xml", use_cache=False):
+        super().__init__()
+        self.anilist_service = anilist_service
+        self.username = username
+        self.media_type = media_type
+        self.filename = filename
+        self.use_cache = use_cache
+        self.mutex = QMutex()
+        self.export_progress = ExportProgress(self.report_progress)
+    
+    def report_progress(self, export_progress):
+        # Called from the fetch and write threads
+        percent = export_progress.percent
+        self.progress.emit(-1 if percent is None else percent)
+        self.status.emit(export_progress.summary())
+    
+    def cancel(self):
+        self.export_progress.cancel()
+        
+    def run(self):
+        try:
+            run_export(self.anilist_service, self.username, self.media_type, self.filename,
+                       progress=self.export_progress, use_cache=self.use_cache)
+            
+            # Use mutex to safely emit signals
+            self.mutex.lock()
+            self.export_progress.report(force=True)
+            self.finished.emit(self.filename)
+            self.progress.emit(100)
+            self.mutex.unlock()
+        except ExportCancelled:
+            self.mutex.lock()
+            self.cancelled.emit()
+            self.mutex.unlock()
+        except Exception as e:
+            self.mutex.lock()
+            self.error.emit(str(e))
+            self.mutex.unlock()
+
+
+# GUI Application
+class AnilistToMALApp(QMainWindow):
+    CLOSE_POLL_MS = 100
+    OUTPUT_FILTERS = ('MAL XML (*.xml);;Compressed MAL XML (*.xml.gz);;'
+                      'JSON Lines (*.jsonl *.jsonl.gz);;CSV (*.csv *.csv.gz)')
+
+    def __init__(self, startup_timer=None, config_path='config.json', token_path='token.json'):
+        super().__init__()
+
+        self.startup_timer = startup_timer or StartupTimer()
+        self.config = Config(config_path)
+        self.token_store = TokenStore(token_path)
+        self.anilist_service = AnilistService(self.config, self, self.token_store)
+        self.startup_timer.mark('config')
+        self.worker = None
+        self.browser_worker = None
+        self.init_ui()
+        self.startup_timer.mark('ui build')
+        
+    def init_ui(self):
+        self.setWindowTitle('Anilist to MAL Exporter')
+        self.setGeometry(300, 300, 500, 300)
+        self.setWindowIcon(QIcon('app.ico'))
+        # Main widget and layout
+        main_widget = QWidget()
+        main_layout = QVBoxLayout()
+        
+        # Username section
+        username_layout = QHBoxLayout()
+        username_label = QLabel('Username:')
+        self.username_edit = QLineEdit(self.config.username)
+        username_layout.addWidget(username_label)
+        username_layout.addWidget(self.username_edit)
+        username_layout.addStretch()
+        
+        # Client ID section
+        client_id_layout = QHBoxLayout()
+        client_id_label = QLabel('Client ID:')
+        self.client_id_edit = QLineEdit(self.config.client_id)
+        client_id_layout.addWidget(client_id_label)
+        client_id_layout.addWidget(self.client_id_edit)
+        client_id_layout.addStretch()
+        
+        # Client Secret section
+        client_secret_layout = QHBoxLayout()
+        client_secret_label = QLabel('Client Secret:')
+        self.client_secret_edit = QLineEdit(self.config.client_secret)
+        client_secret_layout.addWidget(client_secret_label)
+        client_secret_layout.addWidget(self.client_secret_edit)
+        client_secret_layout.addStretch()
+        
+        # Redirect URL section
+        redirect_url_layout = QHBoxLayout()
+        redirect_url_label = QLabel('Redirect URL:')
+        self.redirect_url_edit = QLineEdit(self.config.redirect_url)
+        redirect_url_layout.addWidget(redirect_url_label)
+        redirect_url_layout.addWidget(self.redirect_url_edit)
+        redirect_url_layout.addStretch()
+        
+        # Browser selection section
+        browser_layout = QHBoxLayout()
+        browser_label = QLabel('Default Browser:')
+        self.browser_combo = QComboBox()
+        self.browser_combo.addItem("Default")  # Add default option
+        
+        # Keep the configured browser selectable until discovery finishes
+        if self.config.browser:
+            self.browser_combo.addItem(self.config.browser)
+            self.browser_combo.setCurrentIndex(1)
+        
+        # Installed browsers come from the cache, or are discovered in the background
+        browser_cache = BrowserCache()
+        installed_browsers = browser_cache.load()
+        if installed_browsers is not None:
+            self.add_browsers(installed_browsers)
+        else:
+            self.browser_worker = BrowserDiscoveryWorker(browser_cache)
+            self.browser_worker.found.connect(self.add_browsers, Qt.ConnectionType.QueuedConnection)
+            self.browser_worker.start()
+        
+        browser_layout.addWidget(browser_label)
+        browser_layout.addWidget(self.browser_combo)
+        browser_layout.addStretch()
+        
+        # Save config button
+        save_config_layout = QHBoxLayout()
+        self.save_config_button = QPushButton('Save Configuration')
+        self.save_config_button.clicked.connect(self.save_config)
+        save_config_layout.addWidget(self.save_config_button)
+        save_config_layout.addStretch()
+        
+        # Media type selection
+        media_layout = QHBoxLayout()
+        media_label = QLabel('Media Type:')
+        self.media_combo = QComboBox()
+        self.media_combo.addItems(['ANIME', 'MANGA'])
+        media_layout.addWidget(media_label)
+        media_layout.addWidget(self.media_combo)
+        media_layout.addStretch()
+        
+        # Output file selection; the extension picks the format
+        output_layout = QHBoxLayout()
+        output_label = QLabel('Save To:')
+        self.output_edit = QLineEdit(self.config.output_file)
+        self.output_button = QPushButton('Browse...')
+        self.output_button.clicked.connect(self.choose_output)
+        output_layout.addWidget(output_label)
+        output_layout.addWidget(self.output_edit)
+        output_layout.addWidget(self.output_button)
+        
+        # Reuse a recent download instead of fetching the list again; off by
+        # default so an edited list is never exported from an old copy
+        self.use_cache_check = QCheckBox(
+            f'Use list downloaded in the last {max(1, self.config.cache_ttl // 60)} minutes, if any')
+        self.use_cache_check.setChecked(False)
+        # Only whole-list downloads are cached
+        self.use_cache_check.setEnabled(self.config.cache_ttl > 0 and self.config.fetch_mode == 'collection')
+        if self.config.fetch_mode != 'collection':
+            self.use_cache_check.setToolTip(f'Not used in {self.config.fetch_mode} mode, see fetchMode in config.json')
+        
+        # Progress bar
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.status_label = QLabel('')
+        
+        # Buttons
+        button_layout = QHBoxLayout()
+        self.export_button = QPushButton('Export to MAL')
+        self.export_button.clicked.connect(self.start_export)
+        button_layout.addWidget(self.export_button)
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_export)
+        button_layout.addWidget(self.cancel_button)
+        
+        # Add all layouts to main layout
+        main_layout.addLayout(username_layout)
+        main_layout.addLayout(client_id_layout)
+        main_layout.addLayout(client_secret_layout)
+        main_layout.addLayout(redirect_url_layout)
+        main_layout.addLayout(browser_layout)
+        main_layout.addLayout(save_config_layout)
+        main_layout.addLayout(media_layout)
+        main_layout.addLayout(output_layout)
+        main_layout.addWidget(self.use_cache_check)
+        main_layout.addWidget(self.progress_bar)
+        main_layout.addWidget(self.status_label)
+        main_layout.addLayout(button_layout)
+        main_layout.addStretch()
+        
+        # Set the main layout
+        main_widget.setLayout(main_layout)
+        self.setCentralWidget(main_widget)
+    
+    def add_browsers(self, browsers):
+        for browser in browsers:
+            if self.browser_combo.findText(browser) < 0:
+                self.browser_combo.addItem(browser)
+    
+    def choose_output(self):
+        filename, _ = QFileDialog.getSaveFileName(
+            self, 'Save Export As', self.output_edit.text(), self.OUTPUT_FILTERS)
+        if filename:
+            self.output_edit.setText(filename)
+    
+    def save_config(self):
+        self.config.username = self.username_edit.text()
+        self.config.client_id = self.client_id_edit.text()
+        self.config.client_secret = self.client_secret_edit.text()
+        self.config.redirect_url = self.redirect_url_edit.text()
+        self.config.output_file = self.output_edit.text() or './MAL.xml'
+        
+        # Save browser selection
+        selected_browser = self.browser_combo.currentText()
+        if selected_browser != "Default":
+            self.config.browser = selected_browser
+        else:
+            self.config.browser = ""
+        
+        try:
+            self.config.save()
+            QMessageBox.information(self, 'Success', 'Configuration saved successfully!')
+        except Exception as e:
+            QMessageBox.critical(self, 'Error', f'Failed to save configuration: {str(e)}')
+        
+    def start_export(self):
+        self.export_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.status_label.setText('Connecting to Anilist...')
+        
+        # Update config with current values
+        self.config.username = self.username_edit.text()
+        self.config.output_file = self.output_edit.text() or './MAL.xml'
+        self.anilist_service = AnilistService(self.config, self, self.token_store)
+        
+        # Create and start worker thread
+        self.worker = ExportWorker(
+            self.anilist_service, 
+            self.username_edit.text(), 
+            self.media_combo.currentText(),
+            self.config.output_file,
+            use_cache=self.use_cache_check.isChecked()
+        )
+        
+        # Connect signals using Qt.ConnectionType.QueuedConnection to avoid thread issues
+        self.worker.progress.connect(self.update_progress, Qt.ConnectionType.QueuedConnection)
+        self.worker.status.connect(self.status_label.setText, Qt.ConnectionType.QueuedConnection)
+        self.worker.finished.connect(self.export_finished, Qt.ConnectionType.QueuedConnection)
+        self.worker.cancelled.connect(self.export_cancelled, Qt.ConnectionType.QueuedConnection)
+        self.worker.error.connect(self.show_error, Qt.ConnectionType.QueuedConnection)
+        
+        # Start the worker thread
+        self.worker.start()
+    
+    def update_progress(self, value):
+        if value < 0:
+            # List size unknown: show a busy indicator instead
+            self.progress_bar.setRange(0, 0)
+        else:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(value)
+    
+    def cancel_export(self):
+        if self.worker:
+            self.cancel_button.setEnabled(False)
+            self.status_label.setText('Cancelling...')
+            self.worker.cancel()
+    
+    def reset_controls(self):
+        self.export_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        self.progress_bar.setRange(0, 100)
+        
+        # Clean up worker thread
+        if self.worker:
+            self.worker.wait()
+    
+    def export_finished(self, filename):
+        # The worker has already written the file
+        print(f"Export written to {filename}")
+        self.reset_controls()
+        self.progress_bar.setValue(100)
+    
+    def resume_hint(self):
+        # Paged and status exports are checkpointed, see ExportJournal
+        if self.config.resume_exports and self.config.fetch_mode in ('paged', 'status'):
+            return ' Export again to continue where it stopped.'
+        return ''
+    
+    def export_cancelled(self):
+        self.reset_controls()
+        self.progress_bar.setValue(0)
+        self.status_label.setText('Export cancelled.' + self.resume_hint())
+    
+    def show_error(self, error_message):
+        QMessageBox.critical(
+            self, 'Export Error', 
+            f'An error occurred during export: {error_message}' + self.resume_hint()
+        )
+        self.reset_controls()
+        self.progress_bar.setValue(0)  # Reset progress bar
+        self.status_label.setText('')
+    
+    def closeEvent(self, event):
+        # Stop a running export and only close once its thread is done: a
+        # network read or rate limit wait in progress has to end before the
+        # export notices the cancellation, and Qt aborts if a running
+        # QThread is destroyed
+        running = [worker for worker in (self.worker, self.browser_worker) if worker and worker.isRunning()]
+        if not running:
+            event.accept()
+            return
+        if self.worker in running:
+            self.cancel_button.setEnabled(False)
+            self.export_button.setEnabled(False)
+            self.status_label.setText('Stopping the export before closing...')
+            self.worker.cancel()
+        event.ignore()
+        QTimer.singleShot(self.CLOSE_POLL_MS, self.close)
+
+
+def run_gui(startup_timer=None, config_path='config.json', token_path='token.json') -> int:
+    startup_timer = startup_timer or StartupTimer()
+    app = QApplication(sys.argv)
+    startup_timer.mark('qt init')
+    window = AnilistToMALApp(startup_timer, config_path, token_path)
+    window.show()
+    
+    def first_paint():
+        # Runs once the event loop has painted the shown window
+        startup_timer.mark('first paint')
+        startup_timer.report()
+    QTimer.singleShot(0, first_paint)
+    return app.exec()
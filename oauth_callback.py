@@ -0,0 +1,135 @@
+"""
+Local listener for the OAuth redirect of an Anilist login. Kept apart
+from anilist_to_mal so http.server is only imported when a login actually
+has to go through the browser.
+"""
+import http.server
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, Optional
+
+
+# Custom HTTP request handler for OAuth callback
+class OAuthCallbackHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path == self.server.callback_path:
+            query_components = urllib.parse.parse_qs(url.query)
+            code = query_components.get('code', [''])[0]
+            state = query_components.get('state', [''])[0]
+            
+            if code and self.server.deliver(state, code):
+                self.send_response(200)
+                self.send_header('Content-type', 'text/html')
+                self.end_headers()
+                self.wfile.write(b'Authorization code received. You can close this window.')
+            else:
+                self.send_response(400)
+                self.send_header('Content-type', 'text/html')
+                self.end_headers()
+                self.wfile.write(b'Error: No authorization code received for a pending login.')
+        else:
+            self.send_response(200)
+            self.send_header('Content-type', 'text/html')
+            self.end_headers()
+            self.wfile.write(b'Anilist OAuth server running. Please complete the authorization in your browser.')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class OAuthAuthorization:
+    """One pending authorization, woken up as soon as its callback arrives."""
+    def __init__(self, state: str):
+        self.state = state
+        self.code = ''
+        self._received = threading.Event()
+
+    def deliver(self, code: str) -> None:
+        self.code = code
+        self._received.set()
+
+    def wait(self, timeout: float, progress: Optional[Any] = None) -> str:
+        deadline = time.monotonic() + timeout
+        while not self._received.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (progress and progress.cancelled):
+                break
+            # The event fires the moment the callback arrives; the slice
+            # only bounds how long a cancellation goes unnoticed
+            self._received.wait(min(remaining, 0.5) if progress else remaining)
+        return self.code
+
+
+class OAuthCallbackServer(http.server.ThreadingHTTPServer):
+    """
+    Local listener for OAuth redirects, served from a background thread.
+    Each authorization registers its `state` and waits on its own event, so
+    several accounts can authorize through the same port at once. A port of
+    0 in the redirect URL binds an ephemeral port; the redirect URI sent to
+    Anilist then has to be built from `redirect_uri`.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+    _servers: Dict[Any, 'OAuthCallbackServer'] = {}
+    _servers_lock = threading.Lock()
+
+    def __init__(self, host: str, port: int, callback_path: str):
+        super().__init__((host, port), OAuthCallbackHandler)
+        self.host = host
+        self.callback_path = callback_path
+        self.pending: Dict[str, OAuthAuthorization] = {}
+        self.users = 0
+        self._pending_lock = threading.Lock()
+        # A short poll interval keeps shutdown() from stalling the login
+        threading.Thread(target=self.serve_forever, args=(0.1,), daemon=True).start()
+
+    @property
+    def redirect_uri(self) -> str:
+        return f"http://{self.host}:{self.server_port}{self.callback_path}"
+
+    @classmethod
+    def acquire(cls, redirect_url: str) -> 'OAuthCallbackServer':
+        """Get the listener for `redirect_url`, starting it if needed. Pair with release()."""
+        url = urllib.parse.urlparse(redirect_url or 'http://127.0.0.1:8000/callback')
+        host = url.hostname or '127.0.0.1'
+        port = url.port if url.port is not None else 80
+        key = (host, port)
+        with cls._servers_lock:
+            server = cls._servers.get(key) if port else None
+            if server is None:
+                server = cls(host, port, url.path or '/callback')
+                if port:
+                    cls._servers[key] = server
+                print(f"Starting OAuth callback server at port {server.server_port}")
+            server.users += 1
+            return server
+
+    def release(self) -> None:
+        with self._servers_lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+            self._servers.pop((self.host, self.server_address[1]), None)
+        self.shutdown()
+        self.server_close()
+
+    def expect(self, state: str) -> OAuthAuthorization:
+        authorization = OAuthAuthorization(state)
+        with self._pending_lock:
+            self.pending[state] = authorization
+        return authorization
+
+    def forget(self, authorization: OAuthAuthorization) -> None:
+        with self._pending_lock:
+            self.pending.pop(authorization.state, None)
+
+    def deliver(self, state: str, code: str) -> bool:
+        # A callback without the state of a pending login may be forged
+        with self._pending_lock:
+            authorization = self.pending.get(state)
+        if authorization is None:
+            return False
+        authorization.deliver(code)
+        return True
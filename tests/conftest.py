@@ -0,0 +1,56 @@
+import json
+import threading
+from typing import Any, Dict, List
+
+import pytest
+
+import anilist_to_mal
+from anilist_to_mal import AnimeEntry, RequestScheduler, TokenStore
+from benchmark import generate_collection
+from fake_anilist import FAKE_TOKEN, FakeAnilist, make_server
+
+
+def collection_entries(size: int, media_type: str = 'ANIME') -> List[AnimeEntry]:
+    """The entries of a generated list, as the exporters see them."""
+    collection = generate_collection(size)
+    return [AnimeEntry(item, media_type)
+            for group in collection['data']['MediaListCollection']['lists'] for item in group['entries']]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, where config.json, caches and exports end up."""
+    monkeypatch.chdir(tmp_path)
+    # Keep retries quick; the fake server fails on purpose
+    monkeypatch.setattr(RequestScheduler, 'BASE_DELAY', 0.01)
+    return tmp_path
+
+
+@pytest.fixture
+def anilist(workdir):
+    """
+    Start a fake Anilist API and point config.json in `workdir` at it.
+    Call it with a list size and FakeAnilist options; config settings
+    can be passed as `config={...}`.
+    """
+    servers = []
+
+    def serve(size: int = 500, config: Dict[str, Any] = None, **options) -> FakeAnilist:
+        fake = FakeAnilist(generate_collection(size), **options)
+        server = make_server(fake, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        base = f"http://127.0.0.1:{server.server_port}"
+        settings = {'aniclient': '1', 'anisecret': 'secret', 'username': 'alice',
+                    'oauthUrl': base + '/api/v2/oauth', 'graphqlUrl': base + '/graphql'}
+        settings.update(config or {})
+        with open(workdir / 'config.json', 'w') as f:
+            json.dump(settings, f)
+        TokenStore(str(workdir / 'token.json')).save('1', FAKE_TOKEN, 10 ** 8)
+        return fake
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+    anilist_to_mal.TRACER.enabled = False
@@ -0,0 +1,58 @@
+import json
+import time
+
+import pytest
+
+import anilist_to_mal
+from anilist_to_mal import BrowserCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('PATH', '/usr/bin')
+    return BrowserCache(str(tmp_path / 'browsers.json'))
+
+
+def test_discovered_browsers_are_reused(cache, monkeypatch):
+    found = []
+    monkeypatch.setattr(anilist_to_mal, 'get_installed_browsers', lambda: found.append(1) or ['Firefox'])
+    assert cache.load() is None
+    assert cache.discover() == ['Firefox']
+    assert cache.load() == ['Firefox']
+    assert len(found) == 1
+
+
+def test_changed_path_invalidates_the_cache(cache, monkeypatch):
+    cache.save(['Firefox'])
+    monkeypatch.setenv('PATH', '/usr/bin:/opt/brave/bin')
+    assert cache.load() is None
+
+
+def test_cache_expires(cache, monkeypatch):
+    cache.save(['Firefox'])
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + BrowserCache.MAX_AGE + 1)
+    assert cache.load() is None
+
+
+def test_damaged_cache_is_ignored(cache):
+    with open(cache.cache_path, 'w') as f:
+        f.write('{"browsers": [')
+    assert cache.load() is None
+
+
+def test_cache_from_another_platform_is_ignored(cache):
+    cache.save(['Safari'])
+    with open(cache.cache_path) as f:
+        data = json.load(f)
+    data['fingerprint'] = 'elsewhere'
+    with open(cache.cache_path, 'w') as f:
+        json.dump(data, f)
+    assert cache.load() is None
+
+
+def test_unwritable_cache_is_not_an_error(tmp_path, capsys):
+    cache = BrowserCache(str(tmp_path / 'missing' / 'browsers.json'))
+    cache.save(['Firefox'])
+    assert 'Could not save browser cache' in capsys.readouterr().out
+    assert cache.load() is None
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from anilist_to_mal import AnimeEntry, DiffWriter, MALXmlIndex, MALXmlWriter, iter_mal_xml
+from conftest import collection_entries
+
+
+@pytest.fixture
+def entries():
+    return [entry for entry in collection_entries(40) if entry.id_mal is not None]
+
+
+def write_export(path, entries):
+    with MALXmlWriter(str(path), 'alice', 'ANIME') as writer:
+        writer.write_entries(entries)
+
+
+def write_diff(tmp_path, old_entries, new_entries):
+    old_path = tmp_path / 'old.xml'
+    write_export(old_path, old_entries)
+    with DiffWriter(str(tmp_path / 'diff.xml'), 'alice', 'ANIME', MALXmlIndex(str(old_path)),
+                    str(tmp_path / 'diff.json')) as writer:
+        writer.write_entries(new_entries)
+    with open(tmp_path / 'diff.json', encoding='utf-8') as f:
+        summary = json.load(f)
+    written = [int(item['series_animedb_id']) for item in iter_mal_xml(str(tmp_path / 'diff.xml'))]
+    return summary, written
+
+
+def test_only_added_and_changed_entries_are_written(tmp_path, entries):
+    changed = AnimeEntry.from_tuple(entries[2].astuple())
+    changed.progress += 1
+    new_entries = entries[:2] + [changed] + entries[3:29] + entries[30:]
+    summary, written = write_diff(tmp_path, entries[:30], new_entries)
+
+    added = [entry.id_mal for entry in entries[30:]]
+    assert written == [changed.id_mal] + added
+    assert summary['added_ids'] == added
+    assert summary['changed_entries'] == [{
+        'id_mal': changed.id_mal,
+        'fields': {'my_watched_episodes': [str(entries[2].progress), str(changed.progress)]}
+    }]
+    assert summary['removed_ids'] == [entries[29].id_mal]
+    assert summary['unchanged'] == 28
+
+
+def test_unchanged_list_gives_an_empty_diff(tmp_path, entries):
+    summary, written = write_diff(tmp_path, entries, entries)
+    assert written == []
+    assert (summary['added'], summary['changed'], summary['removed']) == (0, 0, 0)
+    assert summary['unchanged'] == len(entries)
+
+
+def test_index_reads_compressed_exports(tmp_path, entries):
+    write_export(tmp_path / 'old.xml.gz', entries)
+    index = MALXmlIndex(str(tmp_path / 'old.xml.gz'))
+    assert index.entries == {entry.id_mal: MALXmlIndex.entry_values(entry, 'ANIME') for entry in entries}
@@ -0,0 +1,103 @@
+import json
+import runpy
+import sys
+from pathlib import Path
+
+import pytest
+
+from anilist_to_mal import main
+
+pytest.importorskip('PyQt6.QtWidgets')
+
+SETUP_SCRIPT = str(Path(__file__).resolve().parent.parent / 'setup.py')
+
+
+@pytest.fixture
+def offscreen(monkeypatch):
+    monkeypatch.setenv('QT_QPA_PLATFORM', 'offscreen')
+
+
+def test_gui_export_is_traced(anilist, offscreen, monkeypatch):
+    from PyQt6.QtCore import QTimer
+    import gui
+
+    anilist(300, config={'outputFile': 'gui.xml'})
+    show = gui.AnilistToMALApp.show
+
+    def show_and_export(window):
+        show(window)
+        window.start_export()
+        window.worker.finished.connect(lambda filename: QTimer.singleShot(0, window.close))
+    monkeypatch.setattr(gui.AnilistToMALApp, 'show', show_and_export)
+    monkeypatch.setattr(sys, 'argv', ['setup.py', '--trace', 'trace.json'])
+
+    # Run the script the way users start the app
+    with pytest.raises(SystemExit) as exit_info:
+        runpy.run_path(SETUP_SCRIPT, run_name='__main__')
+    assert exit_info.value.code == 0
+    assert Path('gui.xml').exists()
+    with open('trace.json', encoding='utf-8') as f:
+        phases = json.load(f)['phases']
+    assert {'export', 'fetch', 'write'} <= set(phases)
+
+
+def test_gui_is_passed_the_config_and_token_file(monkeypatch):
+    import gui
+
+    calls = []
+    monkeypatch.setattr(gui, 'run_gui', lambda *args: calls.append(args) or 0)
+    assert main(['--config', 'other/config.json', '--token-file', 'other/token.json']) == 0
+    assert calls[0][1:] == ('other/config.json', 'other/token.json')
+
+
+def test_gui_reads_and_saves_the_given_config(anilist, workdir, offscreen, monkeypatch):
+    from PyQt6.QtWidgets import QApplication, QMessageBox
+    import gui
+
+    anilist(100, config={'username': 'carol'})
+    (workdir / 'other').mkdir()
+    (workdir / 'config.json').rename(workdir / 'other' / 'config.json')
+    (workdir / 'token.json').rename(workdir / 'other' / 'token.json')
+    monkeypatch.setattr(QMessageBox, 'information', lambda *args: None)
+
+    app = QApplication.instance() or QApplication([])
+    window = gui.AnilistToMALApp(config_path='other/config.json', token_path='other/token.json')
+    assert window.username_edit.text() == 'carol'
+    assert window.anilist_service.token_store.token_path == 'other/token.json'
+    window.username_edit.setText('dave')
+    window.save_config()
+    window.close()
+    app.processEvents()
+    with open(workdir / 'other' / 'config.json') as f:
+        assert json.load(f)['username'] == 'dave'
+    assert not (workdir / 'config.json').exists()
+
+
+def test_closing_waits_for_the_export_to_stop(anilist, offscreen):
+    from PyQt6.QtWidgets import QApplication
+    import gui
+
+    anilist(300, latency=1.0)
+    app = QApplication.instance() or QApplication([])
+    window = gui.AnilistToMALApp()
+    window.show()
+    window.start_export()
+    # The export is blocked on the slow response; the close has to wait for it
+    assert not window.close()
+    assert window.worker.isRunning()
+    window.worker.wait(10000)
+    app.processEvents()
+    assert window.close()
+
+
+@pytest.mark.parametrize('mode, enabled', [('collection', True), ('paged', False), ('status', False)])
+def test_cache_checkbox_only_in_collection_mode(anilist, offscreen, mode, enabled):
+    from PyQt6.QtWidgets import QApplication
+    import gui
+
+    anilist(10, config={'fetchMode': mode})
+    app = QApplication.instance() or QApplication([])
+    window = gui.AnilistToMALApp()
+    assert window.use_cache_check.isEnabled() == enabled
+    window.close()
+    app.processEvents()
@@ -0,0 +1,66 @@
+import pytest
+
+from anilist_to_mal import AnilistService, AnimeStatus, MALImporter
+
+
+@pytest.fixture
+def importer():
+    # Building mutation arguments doesn't talk to Anilist
+    return MALImporter(None)
+
+
+def test_mal_entry_becomes_mutation_fields(importer):
+    assert importer.entry_fields({
+        'my_status': 'Completed', 'my_watched_episodes': '12', 'my_times_watched': '1', 'my_score': '8',
+        'my_start_date': '2021-04-05', 'my_finish_date': '2021-06-00',
+    }) == {
+        'status': AnimeStatus.COMPLETED, 'progress': 12, 'repeat': 1, 'scoreRaw': 80,
+        'startedAt': {'year': 2021, 'month': 4, 'day': 5}, 'completedAt': {'year': 2021, 'month': 6},
+    }
+
+
+def test_unscored_entry_keeps_the_anilist_score(importer):
+    fields = importer.entry_fields({'my_status': 'Watching', 'my_score': '0', 'my_start_date': '0000-00-00'})
+    assert 'scoreRaw' not in fields
+    assert 'startedAt' not in fields
+
+
+def test_rewatching_entry_is_repeating(importer):
+    assert importer.entry_fields({'my_status': 'Watching', 'my_rewatching': '1'})['status'] == AnimeStatus.REPEATING
+
+
+def test_manga_chapters_are_read(importer):
+    fields = importer.entry_fields({'my_status': 'Reading', 'my_read_chapters': '40', 'my_times_read': '2'})
+    assert (fields['progress'], fields['repeat']) == (40, 2)
+
+
+def test_unknown_status_is_rejected(importer):
+    with pytest.raises(ValueError, match='unknown status'):
+        importer.entry_fields({'my_status': 'Rewatching later'})
+
+
+@pytest.mark.parametrize('text, date', [
+    ('2020-01-02', {'year': 2020, 'month': 1, 'day': 2}),
+    ('2020-00-00', {'year': 2020}),
+    ('0000-00-00', None),
+    ('', None),
+    ('soon', None),
+])
+def test_parse_date(text, date):
+    assert MALImporter.parse_date(text) == date
+
+
+def test_mutation_arguments_are_graphql_literals():
+    assert AnilistService._mutation_arguments({
+        'mediaId': 5, 'status': AnimeStatus.CURRENT, 'progress': 3, 'startedAt': {'year': 2020, 'month': 1},
+    }) == 'mediaId: 5, status: CURRENT, progress: 3, startedAt: {year: 2020, month: 1}'
+
+
+@pytest.mark.parametrize('fields', [
+    {'status': 'CURRENT) { id } other: DeleteMediaListEntry (id: 1'},
+    {'progress': '1) { id }'},
+    {'startedAt': {'year': '2020}'}},
+])
+def test_mutation_arguments_reject_anything_else(fields):
+    with pytest.raises(ValueError):
+        AnilistService._mutation_arguments(fields)
@@ -0,0 +1,188 @@
+"""End-to-end runs of the command line against fake_anilist."""
+import json
+import time
+
+import pytest
+
+from anilist_to_mal import AnilistService, iter_mal_xml, main
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('mode', ['collection', 'status', 'paged'])
+def test_export_recovers_from_dropped_connections(anilist, capsys, mode):
+    anilist(300, config={'fetchMode': mode})
+    assert main(['export', '--output', 'clean.xml']) == 0
+
+    fake = anilist(300, config={'fetchMode': mode}, truncate_every=3)
+    # Cut the very first response short
+    fake.requests = 2
+    assert main(['export', '--output', 'dropped.xml']) == 0
+    assert 'retrying' in capsys.readouterr().out
+    assert read('dropped.xml') == read('clean.xml')
+
+
+def test_batch_reports_retries_per_job(anilist, workdir):
+    anilist(200, config={'fetchMode': 'paged'}, error_rate=0.2)
+    (workdir / 'jobs.txt').write_text('alice\nbob,MANGA\n')
+    assert main(['batch', 'jobs.txt', '--output-dir', 'out']) == 0
+    with open('batch_summary.json', encoding='utf-8') as f:
+        summary = json.load(f)
+    assert [job['error'] for job in summary['jobs']] == [None, None]
+    assert (workdir / 'out' / 'MAL_alice_ANIME.xml').exists()
+    assert (workdir / 'out' / 'MAL_bob_MANGA.xml').exists()
+    assert summary['throttled_seconds'] <= summary['seconds']
+    job_retries = [int(job['payload'].split(' retries')[0].rsplit(' ', 1)[1]) for job in summary['jobs']]
+    assert sum(job_retries) == summary['retries']
+
+
+def test_cached_list_is_only_reused_with_the_cache_flag(anilist):
+    fake = anilist(300)
+    assert main(['export', '--output', 'first.xml']) == 0
+    requests = fake.requests
+    assert main(['export', '--output', 'second.xml']) == 0
+    assert fake.requests > requests
+
+    requests = fake.requests
+    assert main(['export', '--cache', '--output', 'cached.xml']) == 0
+    assert fake.requests == requests
+    assert read('cached.xml') == read('first.xml')
+
+
+def test_cache_flag_warns_outside_collection_mode(anilist, capsys):
+    fake = anilist(300, config={'fetchMode': 'paged'})
+    assert main(['export', '--output', 'first.xml']) == 0
+    requests = fake.requests
+    assert main(['export', '--cache', '--output', 'second.xml']) == 0
+    assert 'only applies to collection mode' in capsys.readouterr().err
+    assert fake.requests > requests
+
+
+def test_caches_are_kept_next_to_config(anilist, workdir, monkeypatch):
+    anilist(100, config={'fetchMode': 'incremental'})
+    (workdir / 'elsewhere').mkdir()
+    monkeypatch.chdir(workdir / 'elsewhere')
+    config = ['--config', '../config.json', '--token-file', '../token.json']
+    assert main(config + ['export', '--output', 'MAL.xml']) == 0
+    assert main(config + ['export', '--mode', 'collection', '--output', 'MAL.xml']) == 0
+    assert {'id_mapping.db', 'response_cache.db'} <= {path.name for path in workdir.iterdir()}
+    assert not list((workdir / 'elsewhere').glob('*.db'))
+
+
+def test_sync_skips_unchanged_lists_and_exports_edits(anilist, workdir):
+    fake = anilist(300)
+    (workdir / 'jobs.txt').write_text('alice\n')
+    sync = ['sync', 'jobs.txt', '--once', '--output-dir', 'out', '--format', 'jsonl']
+    assert main(sync) == 0
+    assert main(sync) == 0
+    with open('sync_status.json', encoding='utf-8') as f:
+        status = json.load(f)
+    assert (status['exports'], status['skipped']) == (1, 1)
+
+    # The response cache still holds the old list; sync must not use it
+    entry = fake.entries[0]
+    entry['progress'] += 1
+    entry['updatedAt'] = int(time.time())
+    assert main(sync) == 0
+    with open('sync_status.json', encoding='utf-8') as f:
+        assert json.load(f)['exports'] == 2
+    with open('out/MAL_alice_ANIME.jsonl', encoding='utf-8') as f:
+        records = {record['media_id']: record for record in map(json.loads, f)}
+    assert records[entry['media']['id']]['progress'] == entry['progress']
+
+
+def test_import_saves_an_exported_list(anilist):
+    fake = anilist(300)
+    assert main(['export', '--output', 'MAL.xml']) == 0
+    exported = list(iter_mal_xml('MAL.xml'))
+    assert main(['import', 'MAL.xml', '--dry-run']) == 0
+    assert fake.saved == {}
+    assert main(['import', 'MAL.xml']) == 0
+    assert len(fake.saved) == len(exported)
+
+
+@pytest.mark.parametrize('mode', ['paged', 'status'])
+def test_failed_export_resumes_from_checkpoints(anilist, monkeypatch, capsys, mode):
+    fake = anilist(1000, config={'fetchMode': mode, 'pageConcurrency': 1})
+    assert main(['export', '--output', 'clean.xml']) == 0
+    full_requests = fake.requests
+
+    fetch_list_page = AnilistService.fetch_list_page
+    fetch_status_list = AnilistService.fetch_status_list
+    calls = []
+
+    def failing_page(self, *args, **kwargs):
+        calls.append(args)
+        if len(calls) == 8:
+            raise ConnectionError('network gone')
+        return fetch_list_page(self, *args, **kwargs)
+
+    def failing_status(self, *args, **kwargs):
+        calls.append(args)
+        if len(calls) == 3:
+            raise ConnectionError('network gone')
+        return fetch_status_list(self, *args, **kwargs)
+    with monkeypatch.context() as patch:
+        patch.setattr(AnilistService, 'fetch_list_page', failing_page)
+        patch.setattr(AnilistService, 'fetch_status_list', failing_status)
+        assert main(['export', '--output', 'resumed.xml']) == 1
+
+    fake.requests = 0
+    assert main(['export', '--output', 'resumed.xml']) == 0
+    assert 'Resuming export' in capsys.readouterr().out
+    assert fake.requests < full_requests
+    assert read('resumed.xml') == read('clean.xml')
+
+
+def fail_at_page_4(anilist, monkeypatch):
+    """Start a paged export of 500 entries that fails after three pages."""
+    fake = anilist(500, config={'fetchMode': 'paged', 'pageConcurrency': 1})
+    fetch_list_page = AnilistService.fetch_list_page
+
+    def failing_page(self, username, media_type, page, *args, **kwargs):
+        if page == 4:
+            raise ConnectionError('network gone')
+        return fetch_list_page(self, username, media_type, page, *args, **kwargs)
+    with monkeypatch.context() as patch:
+        patch.setattr(AnilistService, 'fetch_list_page', failing_page)
+        assert main(['export', '--output', 'MAL.xml']) == 1
+    return fake
+
+
+def exported_ids():
+    return {int(item['series_animedb_id']) for item in iter_mal_xml('MAL.xml')}
+
+
+def test_edit_after_a_failed_export_starts_it_over(anilist, monkeypatch, capsys):
+    fake = fail_at_page_4(anilist, monkeypatch)
+    entry = fake.entries[0]
+    entry['progress'] += 1
+    entry['updatedAt'] = int(time.time())
+    assert main(['export', '--output', 'MAL.xml']) == 0
+    assert 'starting over' in capsys.readouterr().out
+    exported = {int(item['series_animedb_id']): item for item in iter_mal_xml('MAL.xml')}
+    assert exported[entry['media']['idMal']]['my_watched_episodes'] == str(entry['progress'])
+
+
+def test_removal_after_a_failed_export_starts_it_over(anilist, monkeypatch, capsys):
+    fake = fail_at_page_4(anilist, monkeypatch)
+    # Every later entry moves back one place, into pages already stored
+    removed = fake.entries[0]
+    fake.remove(removed['media']['id'])
+    assert main(['export', '--output', 'MAL.xml']) == 0
+    assert 'starting over' in capsys.readouterr().out
+    assert exported_ids() == {item['media']['idMal'] for item in fake.entries if item['media']['idMal']}
+    assert removed['media']['idMal'] not in exported_ids()
+
+
+def test_export_journal_is_kept_next_to_config(anilist, workdir, monkeypatch):
+    anilist(100, config={'fetchMode': 'paged'})
+    (workdir / 'elsewhere').mkdir()
+    monkeypatch.chdir(workdir / 'elsewhere')
+    assert main(['--config', '../config.json', '--token-file', '../token.json', 'export',
+                 '--output', 'MAL.xml']) == 0
+    assert (workdir / 'export_journal.db').exists()
+    assert not (workdir / 'elsewhere' / 'export_journal.db').exists()
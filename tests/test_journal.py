@@ -0,0 +1,140 @@
+import sqlite3
+import time
+
+import pytest
+
+from anilist_to_mal import ExportJournal
+from conftest import collection_entries
+
+KEY = ExportJournal.key('alice', 'ANIME', 'paged', {'xml': 'MAL.xml'}, ['status', 'progress'])
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'export_journal.db')
+
+
+@pytest.fixture
+def journal(db_path):
+    journal = ExportJournal(db_path)
+    yield journal
+    journal.close()
+
+
+def test_recorded_checkpoints_are_replayed(journal):
+    entries = collection_entries(120)
+    started_at, listed, done = journal.open_job(KEY, 120)
+    assert (listed, done) == (120, {})
+    assert list(journal.record(KEY, 0, entries[:50])) == entries[:50]
+    list(journal.record(KEY, 1, entries[50:]))
+
+    # The list size at the start is kept, whatever it is now
+    resumed_at, listed, done = journal.open_job(KEY, 119)
+    assert (resumed_at, listed) == (started_at, 120)
+    assert done == {0: 50, 1: 70}
+    assert journal.replay(KEY, 0) == entries[:50]
+    assert journal.replay(KEY, 1) == entries[50:]
+
+
+def test_checkpoint_read_partway_is_not_kept(journal):
+    journal.open_job(KEY, 120)
+    recording = journal.record(KEY, 0, collection_entries(10))
+    next(recording)
+    recording.close()
+    assert journal.open_job(KEY, 120)[2] == {}
+
+
+def test_checkpoint_larger_than_a_part(journal):
+    journal.PART_SIZE = 8
+    entries = collection_entries(30)
+    journal.open_job(KEY, 120)
+    list(journal.record(KEY, 0, entries))
+    assert journal.replay(KEY, 0) == entries
+
+
+def test_damaged_checkpoint_is_fetched_again(journal, db_path, capsys):
+    journal.open_job(KEY, 120)
+    list(journal.record(KEY, 0, collection_entries(10)))
+    list(journal.record(KEY, 1, collection_entries(10)))
+    with sqlite3.connect(db_path) as db:
+        db.execute('UPDATE part SET body = ? WHERE seq = 0', (b'not zlib',))
+    assert journal.replay(KEY, 0) is None
+    assert 'damaged' in capsys.readouterr().out
+    assert journal.replay(KEY, 1) == collection_entries(10)
+
+
+def test_record_replaces_only_its_own_checkpoint(journal):
+    journal.open_job(KEY, 120)
+    entries = collection_entries(20)
+    list(journal.record(KEY, 0, entries[:10]))
+    list(journal.record(KEY, 1, entries[10:]))
+    list(journal.record(KEY, 0, entries[:5]))
+    assert journal.open_job(KEY, 120)[2] == {0: 5, 1: 10}
+
+
+def test_restart_forgets_checkpoints(journal):
+    started_at, _, _ = journal.open_job(KEY, 120)
+    list(journal.record(KEY, 0, collection_entries(10)))
+    time.sleep(0.01)
+    journal.restart(KEY, 119)
+    list(journal.record(KEY, 0, collection_entries(10)))
+    restarted_at, listed, done = journal.open_job(KEY, 118)
+    assert (listed, done) == (119, {0: 10})
+    assert restarted_at > started_at
+
+
+def test_job_without_checkpoints_starts_afresh(journal):
+    started_at, _, _ = journal.open_job(KEY, 120)
+    time.sleep(0.01)
+    restarted_at, listed, done = journal.open_job(KEY, 119)
+    assert (listed, done) == (119, {})
+    assert restarted_at > started_at
+
+
+def test_finished_job_is_dropped(journal):
+    journal.open_job(KEY, 120)
+    list(journal.record(KEY, 0, collection_entries(10)))
+    journal.finish(KEY)
+    assert journal.open_job(KEY, 120)[2] == {}
+
+
+def test_old_jobs_expire(journal, monkeypatch):
+    journal.open_job(KEY, 120)
+    list(journal.record(KEY, 0, collection_entries(10)))
+    later = time.time() + ExportJournal.MAX_AGE + 60
+    monkeypatch.setattr(time, 'time', lambda: later)
+    assert journal.open_job(KEY, 120)[2] == {}
+
+
+def test_checkpoints_outlast_a_restart_of_the_app(db_path):
+    journal = ExportJournal(db_path)
+    journal.open_job(KEY, 120)
+    list(journal.record(KEY, 0, collection_entries(10)))
+    journal.close()
+    journal = ExportJournal(db_path)
+    try:
+        assert journal.open_job(KEY, 120)[2] == {0: 10}
+    finally:
+        journal.close()
+
+
+def test_journal_of_an_older_layout_is_dropped(db_path):
+    with sqlite3.connect(db_path) as db:
+        db.execute('CREATE TABLE job (key TEXT PRIMARY KEY, started_at REAL NOT NULL, updated_at REAL NOT NULL)')
+        db.execute('INSERT INTO job VALUES (?, 1, 1)', (KEY,))
+    journal = ExportJournal(db_path)
+    try:
+        assert journal.open_job(KEY, 120)[1:] == (120, {})
+    finally:
+        journal.close()
+
+
+def test_edits_shortly_before_the_start_invalidate_checkpoints():
+    # Anilist's clock may run behind ours, so recent edits don't count as older
+    assert ExportJournal.usable_before(10000.0) == 10000.0 - ExportJournal.CLOCK_MARGIN
+
+
+def test_key_depends_on_what_is_exported():
+    assert KEY == ExportJournal.key('Alice', 'ANIME', 'paged', {'xml': 'MAL.xml'}, ['progress', 'status'])
+    assert KEY != ExportJournal.key('alice', 'ANIME', 'status', {'xml': 'MAL.xml'}, ['status', 'progress'])
+    assert KEY != ExportJournal.key('alice', 'ANIME', 'paged', {'csv': 'MAL.csv'}, ['status', 'progress'])
@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from anilist_to_mal import AnimeEntry, IdMappingCache, MalIdResolver
+from conftest import collection_entries
+
+
+class LookupService:
+    """Stands in for AnilistService.fetch_mal_ids and records each lookup."""
+    def __init__(self, mappings):
+        self.mappings = mappings
+        self.lookups = []
+
+    def fetch_mal_ids(self, media_ids):
+        self.lookups.append(sorted(media_ids))
+        return {media_id: self.mappings.get(media_id) for media_id in media_ids}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = IdMappingCache(str(tmp_path / 'id_mapping.db'))
+    yield cache
+    cache.close()
+
+
+def stored_at(monkeypatch, cache, seconds_ago, mappings):
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now - seconds_ago)
+    cache.put_many(mappings)
+    monkeypatch.setattr(time, 'time', lambda: now)
+
+
+def test_mappings_expire_after_their_ttl(cache, monkeypatch):
+    stored_at(monkeypatch, cache, IdMappingCache.RESOLVED_TTL - 60, {1: 101})
+    stored_at(monkeypatch, cache, IdMappingCache.RESOLVED_TTL + 60, {2: 102})
+    stored_at(monkeypatch, cache, IdMappingCache.UNRESOLVED_TTL - 60, {3: None})
+    stored_at(monkeypatch, cache, IdMappingCache.UNRESOLVED_TTL + 60, {4: None})
+    assert cache.get_many([1, 2, 3, 4, 5]) == {1: 101, 3: None}
+
+
+def test_expired_mappings_are_evicted(cache, monkeypatch):
+    stored_at(monkeypatch, cache, IdMappingCache.UNRESOLVED_TTL + 60, {1: None, 2: 102})
+    cache.evict_expired()
+    assert cache._db.execute('SELECT media_id FROM mapping').fetchall() == [(2,)]
+
+
+def without_mal_id(entries):
+    for entry in entries:
+        entry.id_mal = None
+    return sorted(entries, key=lambda entry: entry.media_id)
+
+
+def test_fresh_entries_are_never_looked_up(cache):
+    service = LookupService({})
+    resolver = MalIdResolver(service, cache)
+    entries = collection_entries(10)
+    missing = without_mal_id(entries[:3])
+    assert list(resolver.resolve(entries)) == entries
+    assert resolver.unresolved == missing
+    assert service.lookups == []
+
+
+def test_stale_entries_are_looked_up_once(cache):
+    entries = without_mal_id(collection_entries(5))
+    service = LookupService({1: 501, 2: 502})
+    resolver = MalIdResolver(service, cache)
+    resolved = list(resolver.resolve(entries, {1, 2, 3}))
+    assert sorted((entry.media_id, entry.id_mal) for entry in resolved) == [
+        (1, 501), (2, 502), (3, None), (4, None), (5, None)]
+    assert [entry.media_id for entry in resolver.unresolved] == [4, 5, 3]
+    assert service.lookups == [[1, 2, 3]]
+    # The entries passed in are left as they were
+    assert all(entry.id_mal is None for entry in entries)
+
+    again = MalIdResolver(service, cache)
+    assert list(again.resolve(entries, {1, 2, 3})) == resolved
+    assert service.lookups == [[1, 2, 3]]
+
+
+def test_lookups_are_batched(cache, monkeypatch):
+    monkeypatch.setattr(MalIdResolver, 'BATCH_SIZE', 4)
+    entries = without_mal_id(collection_entries(10))
+    service = LookupService({})
+    resolver = MalIdResolver(service, cache)
+    assert list(resolver.resolve(entries, {entry.media_id for entry in entries})) == entries
+    assert service.lookups == [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]]
+    assert len(resolver.unresolved) == 10
+
+
+def test_without_a_cache_nothing_is_looked_up():
+    entry = AnimeEntry.from_tuple(collection_entries(1)[0].astuple())
+    entry.id_mal = None
+    service = LookupService({entry.media_id: 7})
+    resolver = MalIdResolver(service)
+    assert list(resolver.resolve([entry], {entry.media_id})) == [entry]
+    assert resolver.unresolved == [entry]
+    assert service.lookups == []
@@ -0,0 +1,80 @@
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from anilist_to_mal import ExportProgress
+from oauth_callback import OAuthCallbackServer
+
+
+@pytest.fixture
+def server():
+    server = OAuthCallbackServer.acquire('http://127.0.0.1:0/callback')
+    yield server
+    server.release()
+
+
+def callback(server, query, path='/callback'):
+    """Status code of a browser redirect to the listener."""
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}{path}?{query}", timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_codes_go_to_the_login_with_their_state(server):
+    first = server.expect('first')
+    second = server.expect('second')
+    assert callback(server, 'code=B&state=second') == 200
+    assert callback(server, 'code=A&state=first') == 200
+    assert (first.wait(1), second.wait(1)) == ('A', 'B')
+
+
+@pytest.mark.parametrize('query', ['code=A', 'code=A&state=other', 'state=only'])
+def test_callbacks_without_a_pending_state_are_refused(server, query):
+    # Even with a single login pending, the state has to match
+    authorization = server.expect('only')
+    assert callback(server, query) == 400
+    assert authorization.code == ''
+
+
+def test_forgotten_login_gets_no_code(server):
+    server.forget(server.expect('late'))
+    assert callback(server, 'code=A&state=late') == 400
+
+
+def test_other_paths_are_not_callbacks(server):
+    authorization = server.expect('state')
+    assert callback(server, 'code=A&state=state', path='/') == 200
+    assert authorization.code == ''
+
+
+def test_wait_returns_as_soon_as_the_code_arrives(server):
+    authorization = server.expect('state')
+    threading.Timer(0.1, callback, (server, 'code=A&state=state')).start()
+    assert authorization.wait(30) == 'A'
+
+
+def test_wait_stops_when_the_export_is_cancelled(server):
+    progress = ExportProgress()
+    progress.cancel()
+    assert server.expect('state').wait(30, progress) == ''
+
+
+def test_logins_share_the_listener_of_a_fixed_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    first = OAuthCallbackServer.acquire(f'http://127.0.0.1:{port}/callback')
+    second = OAuthCallbackServer.acquire(f'http://127.0.0.1:{port}/callback')
+    assert first is second
+    first.release()
+    # Still serving the other login
+    assert callback(second, 'code=A&state=state') == 400
+    second.release()
+    third = OAuthCallbackServer.acquire(f'http://127.0.0.1:{port}/callback')
+    assert third is not first
+    third.release()
@@ -0,0 +1,92 @@
+import csv
+import gzip
+import json
+
+import pytest
+
+from anilist_to_mal import (AnimeEntry, AnimeStatus, MALExporter, format_for_filename, iter_mal_xml, main,
+                            output_filenames, unresolved_filename)
+from conftest import collection_entries
+
+
+@pytest.mark.parametrize('filename, formats, outputs', [
+    ('MAL.xml', None, {'xml': 'MAL.xml'}),
+    ('out/list.jsonl.gz', None, {'jsonl.gz': 'out/list.jsonl.gz'}),
+    ('MAL.CSV', None, {'csv': 'MAL.CSV'}),
+    ('MAL.txt', None, {'xml': 'MAL.txt'}),
+    ('out/MAL.xml', ['xml', 'xml.gz', 'jsonl', 'csv'],
+     {'xml': 'out/MAL.xml', 'xml.gz': 'out/MAL.xml.gz', 'jsonl': 'out/MAL.jsonl', 'csv': 'out/MAL.csv'}),
+    ('MAL.xml.gz', ['csv.gz'], {'csv.gz': 'MAL.csv.gz'}),
+    ('MAL.backup', ['jsonl'], {'jsonl': 'MAL.backup.jsonl'}),
+])
+def test_output_filenames(filename, formats, outputs):
+    assert output_filenames(filename, formats) == outputs
+
+
+def test_format_for_filename():
+    assert format_for_filename('a.JSONL.GZ') == 'jsonl.gz'
+    assert format_for_filename('a.gz') == 'xml.gz'
+
+
+def write(tmp_path, entries, formats):
+    outputs = output_filenames(str(tmp_path / 'MAL.xml'), formats)
+    MALExporter.write_outputs([entries[:10], entries[10:]], 'alice', 'ANIME', outputs)
+    return outputs
+
+
+def test_every_format_is_written_in_one_pass(tmp_path):
+    entries = collection_entries(50)
+    outputs = write(tmp_path, entries, ['xml', 'xml.gz', 'jsonl', 'jsonl.gz', 'csv', 'csv.gz'])
+    exported = [entry for entry in entries if entry.id_mal is not None]
+
+    with open(outputs['xml'], encoding='utf-8') as f, gzip.open(outputs['xml.gz'], 'rt', encoding='utf-8') as g:
+        assert f.read() == g.read()
+    assert [int(item['series_animedb_id']) for item in iter_mal_xml(outputs['xml.gz'])] == \
+        [entry.id_mal for entry in exported]
+
+    for name, opener in (('jsonl', open), ('jsonl.gz', gzip.open)):
+        with opener(outputs[name], 'rt', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f]
+        assert [AnimeEntry.from_tuple(record[field] for field in AnimeEntry.__slots__)
+                for record in records] == entries
+
+    for name, opener in (('csv', open), ('csv.gz', gzip.open)):
+        with opener(outputs[name], 'rt', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert [int(row['media_id']) for row in rows] == [entry.media_id for entry in entries]
+        assert [row['mal_status'] for row in rows] == [
+            AnimeStatus.to_mal_status(entry.status, 'ANIME') for entry in entries]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        output.rsplit('/', 1)[1] for output in outputs.values())
+
+
+def test_failed_export_leaves_no_files(tmp_path):
+    def failing():
+        yield from collection_entries(20)
+        raise ConnectionError('network gone')
+    with pytest.raises(ConnectionError):
+        MALExporter.write_outputs([failing()], 'alice', 'ANIME', output_filenames(
+            str(tmp_path / 'MAL.xml'), ['xml', 'jsonl.gz', 'csv']))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_archive_formats_keep_entries_without_a_mal_id(anilist, workdir):
+    fake = anilist(300)
+    assert main(['export', '--output', 'MAL.xml', '--format', 'xml', 'jsonl', 'csv']) == 0
+    listed = fake.entries
+    missing = {item['media']['id'] for item in listed if item['media']['idMal'] is None}
+    assert missing
+
+    with open('MAL.jsonl', encoding='utf-8') as f:
+        assert len(f.readlines()) == len(listed)
+    with open('MAL.csv', encoding='utf-8', newline='') as f:
+        assert len(list(csv.DictReader(f))) == len(listed)
+    assert len(list(iter_mal_xml('MAL.xml'))) == len(listed) - len(missing)
+    with open(unresolved_filename('MAL.xml'), encoding='utf-8') as f:
+        assert {json.loads(line)['media_id'] for line in f} == missing
+
+
+def test_archive_only_export_has_no_unresolved_report(anilist, workdir):
+    anilist(300)
+    assert main(['export', '--output', 'MAL.jsonl']) == 0
+    assert not (workdir / unresolved_filename('MAL.jsonl')).exists()
@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from anilist_to_mal import ResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    caches = []
+
+    def open_cache(**options):
+        cache = ResponseCache(str(tmp_path / 'response_cache.db'), **options)
+        caches.append(cache)
+        return cache
+    yield open_cache
+    for cache in caches:
+        cache.close()
+
+
+def test_key_ignores_username_case_and_query_whitespace():
+    assert ResponseCache.key('Alice', 'ANIME', 'query { a  b }') == ResponseCache.key('alice', 'ANIME', 'query {\n a b }')
+    assert ResponseCache.key('alice', 'ANIME', 'query { a }') != ResponseCache.key('alice', 'MANGA', 'query { a }')
+    assert ResponseCache.key('alice', 'ANIME', 'query { a }') != ResponseCache.key('alice', 'ANIME', 'query { b }')
+
+
+def test_response_is_returned_until_it_expires(cache, monkeypatch):
+    responses = cache(ttl=60)
+    responses.put('key', 'alice', 'ANIME', b'body', 3)
+    assert responses.get('key') == (b'body', 3)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert responses.get('key') is None
+    responses.evict()
+    assert responses._db.execute('SELECT COUNT(*) FROM response').fetchone() == (0,)
+
+
+def test_least_recently_used_responses_go_first(cache):
+    responses = cache(max_bytes=10)
+    responses.put('old', 'alice', 'ANIME', b'1234', 1)
+    responses.put('used', 'bob', 'ANIME', b'1234', 1)
+    # Reading a response counts as using it
+    assert responses.get('old') is not None
+    responses.put('new', 'carol', 'ANIME', b'1234', 1)
+    assert responses.get('used') is None
+    assert responses.get('old') is not None
+    assert responses.get('new') is not None
+
+
+def test_oversized_response_is_not_stored(cache):
+    responses = cache(max_bytes=3)
+    responses.put('key', 'alice', 'ANIME', b'1234', 1)
+    assert responses.get('key') is None
+
+
+def test_responses_outlast_a_restart(cache):
+    cache().put('key', 'alice', 'ANIME', b'body', 1)
+    assert cache().get('key') == (b'body', 1)
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from anilist_to_mal import RateLimiter, RequestScheduler, ThrottleStats
+
+
+class FakeResponse:
+    def __init__(self, status_code: int = 200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def responses(*items):
+    """A request callable answering with `items` in turn; exceptions are raised."""
+    pending = list(items)
+    calls = []
+
+    def request():
+        calls.append(time.monotonic())
+        item = pending.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+    request.calls = calls
+    return request
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RequestScheduler(requests_per_minute=6000, max_retries=2)
+    scheduler.BASE_DELAY = 0.001
+    return scheduler
+
+
+def test_rate_limiter_allows_a_burst_up_to_its_capacity():
+    limiter = RateLimiter(600)
+    start = time.monotonic()
+    for _ in range(600):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.5
+
+
+def test_rate_limiter_paces_requests_once_the_bucket_is_empty():
+    limiter = RateLimiter(1200)
+    limiter.tokens = 0.0
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    # 20 requests per second
+    assert 0.2 <= time.monotonic() - start < 1.0
+
+
+def test_rate_limiter_shrinks_to_a_lower_quota():
+    limiter = RateLimiter(90)
+    limiter.set_rate(30)
+    assert limiter.capacity == 30
+    assert limiter.tokens <= 30
+
+
+def test_overlapping_waits_are_counted_once():
+    stats = ThrottleStats()
+
+    def wait():
+        stats.start_wait()
+        time.sleep(0.2)
+        stats.end_wait()
+    threads = [threading.Thread(target=wait) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Four threads waited 0.2s side by side: that is 0.2s of wall-clock time
+    assert 0.15 <= stats.throttled_seconds < 0.4
+
+
+def test_server_errors_are_retried(scheduler):
+    request = responses(FakeResponse(502), FakeResponse(503), FakeResponse(200))
+    stats = ThrottleStats()
+    assert scheduler.send(request, stats=stats).status_code == 200
+    assert len(request.calls) == 3
+    assert scheduler.stats.retries == stats.retries == 2
+
+
+def test_last_response_is_returned_after_max_retries(scheduler):
+    request = responses(FakeResponse(502), FakeResponse(502), FakeResponse(502))
+    assert scheduler.send(request).status_code == 502
+    assert len(request.calls) == 3
+
+
+def test_mutations_are_not_retried(scheduler):
+    request = responses(FakeResponse(502), FakeResponse(200))
+    assert scheduler.send(request, idempotent=False).status_code == 502
+    assert len(request.calls) == 1
+
+
+def test_dropped_connections_are_retried(scheduler):
+    request = responses(requests.ConnectionError('reset'), FakeResponse(200))
+    assert scheduler.send(request).status_code == 200
+
+
+def test_dropped_connection_is_raised_after_max_retries(scheduler):
+    request = responses(*[requests.ConnectionError('reset')] * 3)
+    with pytest.raises(requests.ConnectionError):
+        scheduler.send(request)
+
+
+def test_retry_after_holds_the_retry_back(scheduler):
+    request = responses(FakeResponse(429, {'Retry-After': '0.3'}), FakeResponse(200))
+    assert scheduler.send(request).status_code == 200
+    assert request.calls[1] - request.calls[0] >= 0.3
+    assert scheduler.stats.throttled_seconds >= 0.25
+
+
+def test_lower_rate_limit_header_slows_pacing(scheduler):
+    request = responses(FakeResponse(200, {'X-RateLimit-Limit': '30'}))
+    scheduler.send(request)
+    assert scheduler.limiter.capacity == 30
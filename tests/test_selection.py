@@ -0,0 +1,37 @@
+import pytest
+
+from anilist_to_mal import AnimeEntry, build_selection
+
+
+def test_xml_selection():
+    assert build_selection('ANIME') == (
+        ' completedAt { day month year } media { episodes id idMal } progress repeat score(format: POINT_10) '
+        'startedAt { day month year } status ')
+
+
+def test_manga_asks_for_chapters():
+    selection = build_selection('MANGA')
+    assert 'chapters' in selection
+    assert 'episodes' not in selection
+
+
+def test_formats_are_merged_without_duplicates():
+    selection = build_selection('ANIME', ['xml', 'jsonl', 'snapshot'])
+    assert selection.split().count('updatedAt') == 1
+    assert selection.split().count('idMal') == 1
+    assert 'updatedAt' not in build_selection('ANIME', ['xml'])
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(KeyError):
+        build_selection('ANIME', ['yaml'])
+
+
+def test_entry_reads_what_the_selection_asks_for():
+    # An xml export doesn't ask for updatedAt; the entry leaves it empty
+    entry = AnimeEntry({
+        'status': 'CURRENT', 'progress': 3, 'score': 7, 'repeat': 0,
+        'startedAt': {'year': 2020, 'month': 1, 'day': 2}, 'completedAt': {'year': None, 'month': None, 'day': None},
+        'media': {'id': 1, 'idMal': 2, 'episodes': 12},
+    })
+    assert (entry.episodes, entry.started_at, entry.completed_at, entry.updated_at) == (12, '2020-1-2', '0000-00-00', None)
@@ -0,0 +1,53 @@
+import json
+
+from anilist_to_mal import AnimeEntry, ListSnapshot
+from conftest import collection_entries
+
+
+def edited(entry: AnimeEntry, **changes) -> AnimeEntry:
+    copy = AnimeEntry.from_tuple(entry.astuple())
+    for name, value in changes.items():
+        setattr(copy, name, value)
+    return copy
+
+
+def test_first_merge_returns_every_entry(tmp_path):
+    snapshot = ListSnapshot('Alice', 'ANIME', str(tmp_path))
+    assert not snapshot.exists
+    entries = collection_entries(20)
+    assert snapshot.merge(entries) == entries
+    assert snapshot.exists
+    assert snapshot.last_updated == max(entry.updated_at for entry in entries)
+
+
+def test_merge_returns_only_new_and_changed_entries(tmp_path):
+    snapshot = ListSnapshot('alice', 'ANIME', str(tmp_path))
+    entries = collection_entries(20)
+    snapshot.merge(entries)
+    changed = edited(entries[3], progress=entries[3].progress + 1, updated_at=2000000000)
+    added = [entry for entry in collection_entries(25) if entry.media_id > 20]
+    assert snapshot.merge([entries[0], changed] + added) == [changed] + added
+    assert snapshot.entries[changed.media_id] == changed
+    assert len(snapshot.entries) == 25
+    assert snapshot.last_updated == 2000000000
+
+
+def test_saved_snapshot_is_loaded_again(tmp_path):
+    snapshot = ListSnapshot('Alice', 'MANGA', str(tmp_path))
+    entries = collection_entries(20, 'MANGA')
+    snapshot.merge(entries)
+    snapshot.save()
+    assert (tmp_path / 'snapshot_alice_manga.json').exists()
+
+    loaded = ListSnapshot('Alice', 'MANGA', str(tmp_path))
+    assert list(loaded.entries.values()) == entries
+    assert loaded.last_updated == snapshot.last_updated
+    assert loaded.merge(entries) == []
+
+
+def test_snapshot_of_an_older_layout_is_rebuilt(tmp_path):
+    with open(tmp_path / 'snapshot_alice_anime.json', 'w') as f:
+        json.dump({'version': ListSnapshot.VERSION - 1, 'last_updated': 5, 'entries': [[1, 2, 3]]}, f)
+    snapshot = ListSnapshot('alice', 'ANIME', str(tmp_path))
+    assert not snapshot.exists
+    assert snapshot.last_updated == 0
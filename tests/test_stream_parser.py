@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from anilist_to_mal import EntryStreamParser, IncompleteResponseError
+from benchmark import generate_collection
+
+
+def chunked(body: bytes, size: int):
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+def listed_entries(collection):
+    return [item for group in collection['data']['MediaListCollection']['lists'] for item in group['entries']]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 1 << 20])
+def test_entries_are_parsed_across_chunk_boundaries(chunk_size):
+    collection = generate_collection(40)
+    body = json.dumps(collection).encode('utf-8')
+    assert list(EntryStreamParser(chunked(body, chunk_size))) == listed_entries(collection)
+
+
+def test_multibyte_characters_split_between_chunks():
+    collection = generate_collection(3)
+    listed_entries(collection)[0]['media']['title'] = 'ソードアート・オンライン'
+    body = json.dumps(collection, ensure_ascii=False).encode('utf-8')
+    assert list(EntryStreamParser(chunked(body, 1))) == listed_entries(collection)
+
+
+@pytest.mark.parametrize('share', [0.3, 0.6, 0.9])
+def test_truncated_response_is_reported(share):
+    body = json.dumps(generate_collection(40)).encode('utf-8')
+    parser = EntryStreamParser(chunked(body[:int(len(body) * share)], 256))
+    with pytest.raises(IncompleteResponseError):
+        list(parser)
+
+
+def test_graphql_error_is_raised():
+    body = json.dumps({'errors': [{'message': 'User not found', 'status': 404}], 'data': None}).encode('utf-8')
+    with pytest.raises(ValueError, match='User not found'):
+        list(EntryStreamParser([body]))
+
+
+def test_empty_list_yields_nothing():
+    body = json.dumps({'data': {'MediaListCollection': {'lists': []}}}).encode('utf-8')
+    assert list(EntryStreamParser([body])) == []
+
+
+def test_unreadable_response_is_an_error():
+    with pytest.raises(ValueError, match='Could not read'):
+        list(EntryStreamParser([b'<html>Bad Gateway</html>']))
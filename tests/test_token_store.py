@@ -0,0 +1,52 @@
+import json
+import os
+import time
+
+from anilist_to_mal import AnilistService, TokenStore, main
+from fake_anilist import FAKE_CODE, FAKE_TOKEN
+
+
+def test_token_is_kept_per_client(tmp_path):
+    store = TokenStore(str(tmp_path / 'token.json'))
+    store.save('1', 'first', 10 ** 6)
+    store.save('2', 'second', 10 ** 6)
+    assert (store.load('1'), store.load('2'), store.load('3')) == ('first', 'second', None)
+    store.clear('1')
+    assert (store.load('1'), store.load('2')) == (None, 'second')
+
+
+def test_token_counts_as_expired_before_it_runs_out(tmp_path):
+    store = TokenStore(str(tmp_path / 'token.json'))
+    store.save('1', 'token', TokenStore.EXPIRY_MARGIN - 10)
+    assert store.load('1') is None
+    store.save('1', 'token', TokenStore.EXPIRY_MARGIN + 10)
+    assert store.load('1') == 'token'
+
+
+def test_token_file_is_private(tmp_path):
+    TokenStore(str(tmp_path / 'token.json')).save('1', 'token', 10 ** 6)
+    assert os.stat(tmp_path / 'token.json').st_mode & 0o077 == 0
+
+
+def test_damaged_token_file_is_ignored(tmp_path):
+    (tmp_path / 'token.json').write_text('{')
+    assert TokenStore(str(tmp_path / 'token.json')).load('1') is None
+
+
+def test_rejected_token_is_replaced(anilist, workdir, monkeypatch, capsys):
+    anilist(100)
+    TokenStore(str(workdir / 'token.json')).save('1', 'revoked-token', 10 ** 8)
+    authorizations = []
+
+    def request_code(service):
+        authorizations.append(service)
+        return FAKE_CODE
+    monkeypatch.setattr(AnilistService, 'request_code', request_code)
+
+    assert main(['export', '--output', 'MAL.xml']) == 0
+    assert 'Access token rejected' in capsys.readouterr().out
+    assert len(authorizations) == 1
+    with open(workdir / 'token.json') as f:
+        stored = json.load(f)['1']
+    assert stored['access_token'] == FAKE_TOKEN
+    assert stored['expires_at'] > time.time()
@@ -0,0 +1,78 @@
+from anilist_to_mal import AnimeEntry, AnimeStatus, MALExporter, MALXmlWriter, escape, iter_mal_xml
+from conftest import collection_entries
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_escape():
+    assert escape('<Tom & Jerry>') == '&lt;Tom &amp; Jerry&gt;'
+    assert escape('&amp;') == '&amp;amp;'
+
+
+def test_markup_in_values_is_escaped(tmp_path):
+    entry = collection_entries(1)[0]
+    # Statuses MAL doesn't know are written as they are
+    entry.status = 'Rewatch <b>&'
+    with MALXmlWriter(str(tmp_path / 'MAL.xml'), 'Tom & <Jerry>', 'ANIME') as writer:
+        writer.write_entries([entry])
+    text = read(tmp_path / 'MAL.xml')
+    assert '<user_name>Tom &amp; &lt;Jerry&gt;</user_name>' in text
+    assert '<my_status>Rewatch &lt;b&gt;&amp;</my_status>' in text
+    # Still well-formed
+    assert [item['my_status'] for item in iter_mal_xml(str(tmp_path / 'MAL.xml'))] == ['Rewatch <b>&']
+
+
+def test_myinfo_totals_count_every_entry(tmp_path):
+    entries = [entry for entry in collection_entries(200) if entry.id_mal is not None]
+    with MALXmlWriter(str(tmp_path / 'MAL.xml'), 'alice', 'ANIME') as writer:
+        # Totals are only known once the last chunk has been written
+        writer.write_entries(entries[:50])
+        writer.write_entries(entries[50:])
+    text = read(tmp_path / 'MAL.xml')
+
+    def count(*statuses):
+        return sum(entry.status in statuses for entry in entries)
+    assert f'<user_total_anime>{len(entries)}</user_total_anime>' in text
+    assert f'<user_total_watching>{count(AnimeStatus.CURRENT, AnimeStatus.REPEATING)}</user_total_watching>' in text
+    assert f'<user_total_completed>{count(AnimeStatus.COMPLETED)}</user_total_completed>' in text
+    assert f'<user_total_onhold>{count(AnimeStatus.PAUSED)}</user_total_onhold>' in text
+    assert f'<user_total_dropped>{count(AnimeStatus.DROPPED)}</user_total_dropped>' in text
+    assert f'<user_total_plantowatch>{count(AnimeStatus.PLANNING)}</user_total_plantowatch>' in text
+    assert text.index('</myinfo>') < text.index('<anime>')
+    assert [int(item['series_animedb_id']) for item in iter_mal_xml(str(tmp_path / 'MAL.xml'))] == \
+        [entry.id_mal for entry in entries]
+
+
+def test_entry_template(tmp_path):
+    entry = AnimeEntry({
+        'status': AnimeStatus.PLANNING, 'progress': 0, 'score': 0, 'repeat': 0,
+        'startedAt': {'year': None, 'month': None, 'day': None},
+        'completedAt': {'year': 2021, 'month': 3, 'day': 4},
+        'media': {'id': 1, 'idMal': 5, 'chapters': 40},
+    }, 'MANGA')
+    assert MALExporter.format_entry(entry, 'MANGA') == (
+        '        <anime>\n'
+        '          <series_animedb_id>5</series_animedb_id>\n'
+        '          <series_episodes>40</series_episodes>\n'
+        '          <my_watched_episodes>0</my_watched_episodes>\n'
+        '          <my_score>0</my_score>\n'
+        '          <my_status>Plan to Read</my_status>\n'
+        '          <my_start_date>0000-00-00</my_start_date>\n'
+        '          <my_finish_date>2021-3-4</my_finish_date>\n'
+        '          <my_times_watched>0</my_times_watched>\n'
+        '          <update_on_import>1</update_on_import>\n'
+        '        </anime>\n\n'
+    )
+
+
+def test_failed_export_leaves_no_file(tmp_path):
+    try:
+        with MALXmlWriter(str(tmp_path / 'MAL.xml'), 'alice', 'ANIME') as writer:
+            writer.write_entries(collection_entries(10))
+            raise RuntimeError('network gone')
+    except RuntimeError:
+        pass
+    assert list(tmp_path.iterdir()) == []